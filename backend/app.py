@@ -1,9 +1,11 @@
 import os
+import threading
 from flask import Flask
 from routes.data_routes import data_bp
 from routes.media_routes import media_bp
 from routes.recommendation_routes import recommendation_bp
 from routes.home_routes import home_bp  # Import home route
+from modules.recommendation import load_embedding_model, warm_up
 
 app = Flask(__name__)
 
@@ -17,5 +19,27 @@ app.register_blueprint(data_bp, url_prefix='/data')
 app.register_blueprint(media_bp, url_prefix='/media')
 app.register_blueprint(recommendation_bp, url_prefix='/recommendation')
 
+def preload_models():
+    """Load the embedding model weights at startup so the first request does not pay for them"""
+    if os.environ.get('PRELOAD_MODELS', 'true').lower() != 'true':
+        return
+    load_embedding_model()
+
+def warm_up_worker():
+    """Encode the course catalog in this serving process, in the background, so requests are served meanwhile"""
+    if os.environ.get('PRELOAD_MODELS', 'true').lower() != 'true':
+        return
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+# Preload the weights at import time so a pre-forking server (see gunicorn.conf.py) loads
+# them once and shares them copy-on-write; each worker encodes the catalog after the fork.
+# Under the debug reloader only the serving child loads.
+# Spawned preprocessing workers re-import this file as __mp_main__ and need no model.
+if __name__ != '__mp_main__' and (__name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    preload_models()
+    if __name__ == '__main__':
+        # The development server does not fork, so it warms up here
+        warm_up_worker()
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,74 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from PIL import Image, ImageDraw
+from modules.encoding_profiles import ENCODING_PROFILES, get_profile
+from modules.video_compiler import FrameStreamEncoder, get_frame_files
+
+def synthetic_frames(directory, num_frames, width, height):
+    """Render a simple moving scene so every profile encodes the same, realistic-looking motion"""
+    for i in range(num_frames):
+        image = Image.new("RGB", (width, height), (30 + i % 40, 60, 90))
+        draw = ImageDraw.Draw(image)
+        x = (i * 7) % max(1, width - height // 4)
+        draw.rectangle([0, height * 3 // 4, width, height], fill=(70, 50, 30))
+        draw.ellipse([x, height // 3, x + height // 4, height // 3 + height // 4], fill=(240, 200, 60))
+        for j in range(0, width, 64):
+            draw.line([(j + i % 64, 0), (j, height * 3 // 4)], fill=(90, 120, 150), width=2)
+        image.save(os.path.join(directory, f"frame_{i+1:04d}.png"))
+    return get_frame_files(directory)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare encoding speed and output size of the video profiles")
+    parser.add_argument("--frames-dir", default=None,
+                        help="Directory of frame_*.png files (default: render synthetic frames)")
+    parser.add_argument("--frames", type=int, default=240,
+                        help="Number of synthetic frames (default: 240)")
+    parser.add_argument("--width", type=int, default=1024,
+                        help="Synthetic frame width (default: 1024)")
+    parser.add_argument("--height", type=int, default=768,
+                        help="Synthetic frame height (default: 768)")
+    parser.add_argument("--fps", type=int, default=24,
+                        help="Output frames per second (default: 24)")
+    parser.add_argument("--profiles", nargs="+", choices=list(ENCODING_PROFILES), default=list(ENCODING_PROFILES),
+                        help="Profiles to benchmark (default: all)")
+
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="encode_bench_")
+    try:
+        if args.frames_dir:
+            frame_files = get_frame_files(args.frames_dir)
+        else:
+            frame_files = synthetic_frames(workdir, args.frames, args.width, args.height)
+        if not frame_files:
+            print("No frames to encode.")
+            return
+
+        # Decode once up front so the timings measure encoding, not PNG decoding
+        frames = []
+        for path in frame_files:
+            with Image.open(path) as img:
+                frames.append(img.convert("RGB"))
+
+        print("=== Encoding Profile Benchmark ===")
+        print(f"{len(frames)} frames of {frames[0].width}x{frames[0].height} at {args.fps} fps, {os.cpu_count()} CPUs")
+        print(f"{'profile':<10} {'size':>9} {'enc fps':>8} {'seconds':>8} {'bytes':>11} {'kbit/s':>8}")
+        for name in args.profiles:
+            output_path = os.path.join(workdir, f"{name}.mp4")
+            start = time.perf_counter()
+            with FrameStreamEncoder(output_path, fps=args.fps, profile=get_profile(name)) as encoder:
+                for frame in frames:
+                    encoder.write(frame)
+            seconds = time.perf_counter() - start
+            size = os.path.getsize(output_path)
+            kbps = size * 8 / 1000 / (len(frames) / args.fps)
+            print(f"{name:<10} {encoder.size[0]:>4}x{encoder.size[1]:<4} {len(frames) / seconds:>8.1f} "
+                  f"{seconds:>8.2f} {size:>11,} {kbps:>8.0f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from modules.data_preprocessing import OUTPUT_FORMATS, clean_csv_stream, load_cleaned_data, PREPROCESS_CHUNK_ROWS
+
+def synthetic_export(path, num_rows, seed=0):
+    """Write a curriculum-metadata-like CSV with repeated rows and some missing ratings"""
+    rng = np.random.default_rng(seed)
+    course_ids = rng.integers(0, max(1, num_rows * 3 // 5), num_rows)
+    pd.DataFrame({
+        "course_id": course_ids,
+        "title": [f"Course {i}: Module {i % 12}" for i in course_ids],
+        "difficulty": np.array(["beginner", "intermediate", "advanced"])[course_ids % 3],
+        "category": np.array(["programming", "design", "data", "business", "language"])[course_ids % 5],
+        "hours": (course_ids % 40) + 0.5,
+        "rating": np.where(course_ids % 97 == 0, np.nan, (course_ids % 50) / 10),
+        "enrolled": course_ids % 5000,
+    }).to_csv(path, index=False)
+    return path
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare output size and load time of the preprocessing formats")
+    parser.add_argument("--input", default=None,
+                        help="CSV export to clean (default: generate a synthetic one)")
+    parser.add_argument("--rows", type=int, default=500000,
+                        help="Rows of the synthetic export (default: 500000)")
+    parser.add_argument("--chunk-rows", type=int, default=PREPROCESS_CHUNK_ROWS,
+                        help=f"Rows per chunk while cleaning (default: {PREPROCESS_CHUNK_ROWS})")
+    parser.add_argument("--formats", nargs="+", choices=OUTPUT_FORMATS, default=list(OUTPUT_FORMATS),
+                        help="Output formats to benchmark (default: all)")
+
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="preprocess_bench_")
+    try:
+        input_path = args.input or synthetic_export(os.path.join(workdir, "export.csv"), args.rows)
+        print("=== Preprocessing Output Benchmark ===")
+        print(f"Input: {input_path} ({os.path.getsize(input_path):,} bytes)")
+        print(f"{'format':<16} {'clean s':>8} {'rows/s':>9} {'bytes':>12} {'load s':>7} {'memory':>12}")
+        for output_format in args.formats:
+            output_path = os.path.join(workdir, f"cleaned.{output_format}")
+            stats = clean_csv_stream(input_path, output_path, chunk_rows=args.chunk_rows, output_format=output_format)
+            size = os.path.getsize(output_path)
+            loads = [(output_format, load_cleaned_data)]
+            if output_format == "csv":
+                # What consumers got before: plain read_csv, text columns as object
+                loads.insert(0, ("csv (read_csv)", pd.read_csv))
+            for label, loader in loads:
+                df, seconds = timed(loader, output_path)
+                memory = df.memory_usage(deep=True).sum()
+                print(f"{label:<16} {stats['seconds']:>8.2f} {stats['rows_per_second']:>9,} {size:>12,} "
+                      f"{seconds:>7.2f} {memory:>12,}")
+        print("memory is the loaded DataFrame's deep size in bytes; parquet and feather are read memory-mapped")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import os
 import sys
 import argparse
-from modules.image_prompting import generate_video_prompts
-from modules.together_image_generator import generate_images_from_prompts
+from modules.image_prompting import open_prompt_sequence, GEMINI_MODEL, PROMPT_MODES
+from modules.prompt_store import get_prompt_store
+from modules.encoding_profiles import ENCODING_PROFILES
+from modules.together_image_generator import load_prompts
+from modules.frame_manifest import FrameManifest
+from modules.animation_pipeline import run_animation_pipeline, PIPELINE_QUEUE_SIZE
 
 def main():
     parser = argparse.ArgumentParser(description='Generate a video animation from a text description')
@@ -11,6 +15,25 @@ def main():
     parser.add_argument('--steps', type=int, default=4, help='Number of diffusion steps for image generation (default: 4, max 4 for FLUX models)')
     parser.add_argument('--model', type=str, default="black-forest-labs/FLUX.1-schnell-Free", 
                         help='Model to use for image generation')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Maximum number of image requests in flight (default: 4)')
+    parser.add_argument('--rps', type=float, default=2.0,
+                        help='Maximum image API requests per second (default: 2)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Reuse the prompts of the previous run and only render frames that are missing or failed')
+    parser.add_argument('--fps', type=int, default=12,
+                        help='Frames per second of the output video (default: 12)')
+    parser.add_argument('--output', default=None,
+                        help='Output video path (default: outputs/output.mp4)')
+    parser.add_argument('--prompt-mode', choices=PROMPT_MODES, default="sequential",
+                        help='"sequential" asks for each prompt from the previous one; "keyframes" plans keyframes '
+                             'and fills the frames between them with concurrent batched calls (default: sequential)')
+    parser.add_argument('--no-prompt-store', action='store_true',
+                        help='Always generate new prompts instead of reusing stored sequences for the same scene')
+    parser.add_argument('--profile', choices=list(ENCODING_PROFILES), default=None,
+                        help='Encoding profile for the video (default: VIDEO_PROFILE or standard)')
+    parser.add_argument('--queue-size', type=int, default=PIPELINE_QUEUE_SIZE,
+                        help=f'Capacity of the queues between pipeline stages (default: {PIPELINE_QUEUE_SIZE})')
     
     args = parser.parse_args()
     
@@ -18,32 +41,56 @@ def main():
     output_dir = os.path.join(os.path.dirname(__file__), "outputs")
     os.makedirs(output_dir, exist_ok=True)
     
-    print(f"== Generating prompts for scene: {args.scene} ==")
-    # Generate prompts
-    prompts = generate_video_prompts(args.scene, num_frames=args.frames)
+    # On resume, render from the same prompts as the interrupted run instead of asking for new ones
+    prompts = None
+    prompt_path = None
+    if args.resume:
+        prompt_path = FrameManifest.load(output_dir).prompts_file
+        if prompt_path and os.path.exists(prompt_path):
+            print(f"== Resuming with prompts from {prompt_path} ==")
+            prompts = load_prompts(prompt_path)
+        else:
+            print("No previous run to resume; generating new prompts.")
+            prompt_path = None
     
-    # Find the latest generated prompts file
-    prompt_files = [f for f in os.listdir('/Users/jeevanbhatta/SkillMitra') 
-                   if f.startswith('generated_prompts_') and f.endswith('.json')]
-    if not prompt_files:
-        print("No prompt files found. Exiting.")
-        sys.exit(1)
+    store = None if args.no_prompt_store else get_prompt_store()
+    source = "manifest"
+    if prompts is None:
+        print(f"== Generating prompts for scene: {args.scene} ==")
+        try:
+            # New prompts are rendered as they arrive rather than after the whole sequence is written
+            prompts, source = open_prompt_sequence(args.scene, args.frames, mode=args.prompt_mode, store=store)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            sys.exit(1)
     
-    # Get the most recent file
-    latest_prompt_file = sorted(prompt_files)[-1]
-    prompt_path = os.path.join('/Users/jeevanbhatta/SkillMitra', latest_prompt_file)
-    
-    print(f"== Generating images from prompts in {prompt_path} ==")
-    # Generate images
-    image_paths = generate_images_from_prompts(
-        prompt_path, 
-        output_dir=output_dir,
+    print(f"== Rendering and encoding frames as prompts arrive ==")
+    result = run_animation_pipeline(
+        prompts,
+        output_dir,
+        video_path=args.output,
         model=args.model,
-        steps=args.steps
+        steps=args.steps,
+        fps=args.fps,
+        concurrency=args.concurrency,
+        requests_per_second=args.rps,
+        queue_size=args.queue_size,
+        resume=args.resume,
+        prompts_path=prompt_path,
+        profile=args.profile
     )
     
+    if store is not None and source in ("generated", "extended") and os.path.exists(result['prompts_path']):
+        stored_path = store.put(args.scene, load_prompts(result['prompts_path']), GEMINI_MODEL, args.prompt_mode,
+                                num_frames=args.frames)
+        if stored_path:
+            print(f"Prompts stored in {stored_path}")
+    
     print(f"\n== Generation complete! ==")
-    print(f"Generated {len(image_paths)} images in {output_dir}")
+    print(f"Generated {len(result['frame_paths'])} images in {output_dir}")
+    if result['video_path']:
+        print(f"Video saved to: {result['video_path']}")
+    print(f"Timings (s): {result['timings']}")
 
 if __name__ == "__main__":
     main()
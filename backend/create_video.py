@@ -1,6 +1,7 @@
 import os
 import argparse
 from modules.video_compiler import create_video_from_frames
+from modules.encoding_profiles import ENCODING_PROFILES, DEFAULT_ENCODING_PROFILE
 
 def main():
     parser = argparse.ArgumentParser(description="Create video from frames in the outputs directory")
@@ -14,6 +15,9 @@ def main():
                         help="Target width for output video")
     parser.add_argument("--height", type=int, default=None, 
                         help="Target height for output video")
+    parser.add_argument("--profile", choices=list(ENCODING_PROFILES), default=DEFAULT_ENCODING_PROFILE,
+                        help="Encoding profile: " + "; ".join(f"{name}: {p['description']}" for name, p in ENCODING_PROFILES.items())
+                             + f" (default: {DEFAULT_ENCODING_PROFILE})")
     
     args = parser.parse_args()
     
@@ -37,6 +41,7 @@ def main():
     print(f"Looking for frames in: {output_dir}")
     print(f"Output video: {output_path}")
     print(f"FPS: {actual_fps} (original: {args.fps}, slowdown: {args.slowdown}x)")
+    print(f"Profile: {args.profile}")
     
     if resize:
         print(f"Resizing to: {resize[0]}x{resize[1]}")
@@ -46,7 +51,8 @@ def main():
             output_dir,
             output_path,
             fps=actual_fps,
-            resize=resize
+            resize=resize,
+            profile=args.profile
         )
         print("=== Video Creation Complete! ===")
         print(f"Video saved to: {video_path}")
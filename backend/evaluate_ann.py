@@ -0,0 +1,72 @@
+import time
+import argparse
+import numpy as np
+from modules.ann_index import IVFIndex
+from modules.course_embeddings import normalize_rows
+from modules.ranking import top_k
+
+def synthetic_catalog(num_courses, dim, num_topics, seed=0):
+    """Generate clustered, normalized vectors that resemble a topical course catalog"""
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((num_topics, dim)).astype(np.float32)
+    labels = rng.integers(0, num_topics, num_courses)
+    vectors = topics[labels] + 1.5 * rng.standard_normal((num_courses, dim)).astype(np.float32)
+    return normalize_rows(vectors), topics
+
+def synthetic_queries(topics, num_queries, seed=1):
+    """Generate user queries that mix two random topics, like users with several interests"""
+    rng = np.random.default_rng(seed)
+    first = rng.integers(0, topics.shape[0], num_queries)
+    second = rng.integers(0, topics.shape[0], num_queries)
+    weight = rng.uniform(0.3, 0.7, (num_queries, 1)).astype(np.float32)
+    queries = weight * topics[first] + (1 - weight) * topics[second]
+    queries += 1.0 * rng.standard_normal((num_queries, topics.shape[1])).astype(np.float32)
+    return normalize_rows(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate IVF recall@k against exact cosine search")
+    parser.add_argument("--courses", type=int, default=200000,
+                        help="Number of synthetic courses (default: 200000)")
+    parser.add_argument("--dim", type=int, default=384,
+                        help="Embedding dimension (default: 384)")
+    parser.add_argument("--topics", type=int, default=500,
+                        help="Number of topic clusters in the catalog (default: 500)")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Number of queries to evaluate (default: 200)")
+    parser.add_argument("--k", type=int, default=3,
+                        help="Recall cutoff (default: 3)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64],
+                        help="nprobe values to evaluate")
+
+    args = parser.parse_args()
+
+    print("=== ANN Recall Evaluation ===")
+    print(f"Catalog: {args.courses} courses x {args.dim} dims, {args.topics} topics")
+
+    catalog, topics = synthetic_catalog(args.courses, args.dim, args.topics)
+    queries = synthetic_queries(topics, args.queries)
+
+    start = time.perf_counter()
+    index = IVFIndex(catalog)
+    print(f"Index build: {time.perf_counter() - start:.1f}s ({index.n_lists} lists)")
+
+    # Exact ground truth
+    start = time.perf_counter()
+    exact = [set(top_k(catalog @ q, args.k).tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"Exact scan: {exact_ms:.2f} ms/query")
+
+    print(f"\n{'nprobe':>8} {'recall@' + str(args.k):>10} {'ms/query':>10} {'speedup':>8}")
+    for nprobe in args.nprobe:
+        hits = 0
+        start = time.perf_counter()
+        for q, truth in zip(queries, exact):
+            candidates, similarities = index.search(q, nprobe=nprobe)
+            found = candidates[top_k(similarities, args.k)]
+            hits += len(truth.intersection(found.tolist()))
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = hits / (len(queries) * args.k)
+        print(f"{nprobe:>8} {recall:>10.3f} {ann_ms:>10.2f} {exact_ms / ann_ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import os
+
+# Import the app (and load the embedding model weights) once in the master process,
+# then fork workers so they share the model weights copy-on-write.
+preload_app = True
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', '2'))
+# Threads in each worker share that worker's single model instance
+threads = int(os.environ.get('WEB_THREADS', '4'))
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+
+def post_fork(server, worker):
+    # The master never runs the model: torch thread pools do not survive a fork,
+    # so each worker encodes the catalog itself once it has been forked
+    from app import warm_up_worker
+    warm_up_worker()
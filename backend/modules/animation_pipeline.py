@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import queue
+import threading
+from datetime import datetime
+from modules.frame_manifest import FrameManifest
+from modules.image_cache import get_image_cache
+from modules.together_image_generator import create_client, get_rate_limiter, generate_image_with_retry
+from modules.video_compiler import FrameStreamEncoder
+
+# Frames that may be in flight between the prompt stage and the encoder
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "8"))
+
+_DONE = object()
+
+def save_prompt_file(prompts, output_path):
+    """Write prompts in the SequentialImagePromptGenerator JSON format, atomically"""
+    data = {
+        "timestamp": datetime.now().isoformat(),
+        "frame_count": len(prompts),
+        "prompts": prompts
+    }
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+def run_animation_pipeline(
+    prompts,
+    output_dir,
+    video_path=None,
+    model="black-forest-labs/FLUX.1-schnell-Free",
+    steps=4,
+    fps=12,
+    concurrency=4,
+    requests_per_second=2.0,
+    queue_size=PIPELINE_QUEUE_SIZE,
+    resume=False,
+    use_cache=True,
+    prompts_path=None,
+    profile=None
+):
+    """
+    Generate prompts, render frames and encode the video as one streaming pipeline.
+
+    Each prompt is sent to image generation as soon as it is produced, and each
+    finished frame is handed to the encoder in frame order, so the three stages
+    overlap and the run takes roughly as long as its slowest stage. Bounded
+    queues provide backpressure: at most queue_size + concurrency frames are
+    between the prompt generator and the encoder at any time, so a slow stage
+    pauses the ones feeding it instead of piling up work.
+
+    Args:
+        prompts: Iterable of prompts, e.g. SequentialImagePromptGenerator.iter_prompt_sequence(...)
+        output_dir: Directory for frame_0001.png, ..., manifest.json and prompts.json
+        video_path: Output video (default: output_dir/output.mp4)
+        model: Together image model
+        steps: Diffusion steps (1-4 for FLUX models)
+        fps: Frames per second of the output video
+        concurrency: Maximum number of image requests in flight at once
+        requests_per_second: Shared token-bucket rate limit for image API calls
+        queue_size: Capacity of the queues between stages
+        resume: Skip frames the manifest records as done whose files still verify
+        use_cache: Reuse identical earlier renders from the shared image cache
+        prompts_path: Where to save the prompts (default: output_dir/prompts.json)
+        profile: Encoding profile for the video (default: VIDEO_PROFILE or "standard")
+
+    Returns:
+        Dict with the video path, frame paths in order, failed frame numbers and stage timings
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    video_path = video_path or os.path.join(output_dir, "output.mp4")
+    prompts_path = os.path.abspath(prompts_path or os.path.join(output_dir, "prompts.json"))
+    concurrency = max(1, concurrency)
+
+    manifest = FrameManifest.load(output_dir, prompts_path) if resume else FrameManifest(output_dir, prompts_path)
+    client = create_client()
+    rate_limiter = get_rate_limiter(requests_per_second)
+    cache = get_image_cache() if use_cache else None
+
+    prompt_queue = queue.Queue(maxsize=queue_size)
+    frame_queue = queue.Queue(maxsize=queue_size)
+    # Released by the encoder, so the reorder buffer stays bounded while an early frame is slow
+    window = threading.Semaphore(queue_size + concurrency)
+    stop = threading.Event()
+    produced = []
+    errors = []
+    timings = {}
+    start = time.perf_counter()
+
+    def produce():
+        try:
+            for i, prompt in enumerate(prompts):
+                window.acquire()
+                if stop.is_set():
+                    break
+                produced.append(prompt)
+                prompt_queue.put((i, prompt))
+        except Exception as e:
+            errors.append(e)
+            print(f"Prompt generation failed after {len(produced)} prompts: {e}")
+        finally:
+            timings["prompts_done"] = time.perf_counter() - start
+            # Saved as soon as the sequence is complete, so an interrupted render can be resumed
+            if produced:
+                save_prompt_file(list(produced), prompts_path)
+            for _ in range(concurrency):
+                prompt_queue.put(_DONE)
+
+    def render():
+        while True:
+            item = prompt_queue.get()
+            if item is _DONE:
+                return
+            i, prompt = item
+            output_path = os.path.join(output_dir, f"frame_{i+1:04d}.png")
+            if resume and manifest.is_complete(i + 1, prompt, model, steps, output_path):
+                frame_queue.put((i, output_path))
+                continue
+            if stop.is_set():
+                frame_queue.put((i, None))
+                continue
+            try:
+                generate_image_with_retry(client, prompt, model, output_path, steps, rate_limiter=rate_limiter, cache=cache)
+            except Exception as e:
+                print(f"Error generating image {i+1}: {str(e)}")
+                manifest.update(i + 1, prompt, model, steps, "failed", output_path, error=e)
+                frame_queue.put((i, None))
+                continue
+            manifest.update(i + 1, prompt, model, steps, "done", output_path)
+            frame_queue.put((i, output_path))
+
+    def render_all():
+        workers = [threading.Thread(target=render, daemon=True) for _ in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        timings["frames_done"] = time.perf_counter() - start
+        frame_queue.put(_DONE)
+
+    threads = [threading.Thread(target=produce, daemon=True), threading.Thread(target=render_all, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    # The encoder runs on the calling thread and consumes frames strictly in order
+    frame_paths = []
+    failed = []
+    pending = {}
+    next_index = 0
+    encoder = FrameStreamEncoder(video_path, fps=fps, profile=profile)
+    try:
+        while True:
+            item = frame_queue.get()
+            if item is _DONE:
+                break
+            i, path = item
+            pending[i] = path
+            while next_index in pending:
+                path = pending.pop(next_index)
+                if path is None:
+                    failed.append(next_index + 1)
+                else:
+                    encoder.write(path)
+                    frame_paths.append(path)
+                next_index += 1
+                window.release()
+    finally:
+        # Unblock the producer if the encoder stopped early
+        stop.set()
+        for _ in range(concurrency):
+            window.release()
+        video = encoder.close()
+        for thread in threads:
+            thread.join(timeout=1.0)
+
+    timings["encode_done"] = time.perf_counter() - start
+    if errors and not produced:
+        raise errors[0]
+
+    print(f"{len(frame_paths)} of {len(produced)} frames encoded into {video} in {timings['encode_done']:.1f}s")
+    if failed:
+        print(f"{len(failed)} frames failed; rerun with resume=True (--resume) to retry only those frames.")
+    if cache is not None:
+        report = cache.report()
+        print(f"Image cache: {report['hit_rate']:.0%} hit rate, {report['bytes_saved'] / 1024 ** 2:.1f} MB of renders reused")
+
+    return {
+        "video_path": video,
+        "frame_paths": frame_paths,
+        "failed_frames": failed,
+        "prompts_path": prompts_path,
+        "timings": {name: round(seconds, 2) for name, seconds in timings.items()}
+    }
@@ -0,0 +1,116 @@
+import os
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Catalogs smaller than this are scanned exactly; the index only pays off for large catalogs
+ANN_MIN_CATALOG_SIZE = int(os.environ.get("ANN_MIN_CATALOG_SIZE", "20000"))
+# Number of inverted lists probed per query: higher means better recall and slower queries
+ANN_NPROBE = int(os.environ.get("ANN_NPROBE", "16"))
+# Set RECOMMENDATION_ANN=off to always use the exact scan
+ANN_ENABLED = os.environ.get("RECOMMENDATION_ANN", "auto").lower() != "off"
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """Assign each vector to its most similar centroid, in batches to bound memory."""
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], batch_size):
+        block = vectors[start:start + batch_size]
+        labels[start:start + batch_size] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(vectors: np.ndarray, n_lists: int, iterations: int = 10,
+                    sample_size: Optional[int] = None, seed: int = 0) -> np.ndarray:
+    """
+    Train spherical k-means centroids on normalized vectors.
+
+    Args:
+        vectors: Normalized float32 matrix, one row per item
+        n_lists: Number of centroids (inverted lists)
+        iterations: Number of k-means iterations
+        sample_size: Rows used for training (default: 64 per list)
+        seed: Random seed so the same catalog always gives the same index
+
+    Returns:
+        Normalized float32 centroid matrix of shape (n_lists, dim)
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(vectors.shape[0], sample_size or n_lists * 64)
+    sample = vectors[rng.choice(vectors.shape[0], sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=n_lists)
+        # Re-seed empty lists from random sample points
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine similarity over normalized vectors.
+
+    Vectors are clustered with spherical k-means and stored contiguously by
+    cluster. A query scores the centroids, then only scans the ``nprobe``
+    closest lists.
+    """
+
+    def __init__(self, vectors: np.ndarray, n_lists: Optional[int] = None, nprobe: int = ANN_NPROBE, seed: int = 0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.size = vectors.shape[0]
+        self.n_lists = n_lists or max(1, int(np.sqrt(self.size)))
+        self.nprobe = nprobe
+
+        self.centroids = train_centroids(vectors, self.n_lists, seed=seed)
+        labels = _assign(vectors, self.centroids)
+
+        # Reorder vectors so each list is a contiguous slice
+        self.order = np.argsort(labels, kind="stable").astype(np.int64)
+        self.vectors = vectors[self.order]
+        counts = np.bincount(labels, minlength=self.n_lists)
+        self.offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def search(self, query: np.ndarray, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return candidate indices and their similarities to the query.
+
+        Args:
+            query: Normalized query vector
+            nprobe: Lists to scan, overriding the index default
+
+        Returns:
+            Tuple of (indices into the original matrix, cosine similarities)
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        if nprobe < self.n_lists:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(self.n_lists)
+
+        positions = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in probe])
+        similarities = self.vectors[positions] @ query
+        return self.order[positions], similarities
+
+
+def build_index(vectors: np.ndarray, min_size: int = ANN_MIN_CATALOG_SIZE) -> Optional[IVFIndex]:
+    """Build an IVF index for large catalogs, or return None to use the exact scan."""
+    if not ANN_ENABLED or vectors.shape[0] < min_size:
+        return None
+    logger.info(f"Building IVF index for {vectors.shape[0]} vectors")
+    index = IVFIndex(vectors)
+    logger.info(f"IVF index ready with {index.n_lists} lists, nprobe={index.nprobe}")
+    return index
@@ -0,0 +1,324 @@
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+from typing import AsyncIterator, Dict, List, Optional
+import google.generativeai as genai
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+from modules.image_prompting import (
+    GOOGLE_API_KEY, GEMINI_MODEL, KEYFRAME_INTERVAL, FRAME_BATCH_SIZE, PROMPT_CONCURRENCY, PROMPT_MODES, JSON_RESPONSE,
+    SequentialImagePromptGenerator, keyframe_layout
+)
+from modules.prompt_store import get_prompt_store
+
+# Gemini requests per second across every job in the process
+GEMINI_RPS = float(os.environ.get("GEMINI_RPS", "2"))
+# Retry tokens: each failure spends one, each success earns back GEMINI_RETRY_RATIO, and
+# retries stop while fewer than half remain, so an outage cannot turn into a retry storm
+GEMINI_RETRY_BUDGET = float(os.environ.get("GEMINI_RETRY_BUDGET", "10"))
+GEMINI_RETRY_RATIO = float(os.environ.get("GEMINI_RETRY_RATIO", "0.1"))
+# Seconds allowed for one API call and for one whole prompt-generation job
+GEMINI_CALL_TIMEOUT = float(os.environ.get("GEMINI_CALL_TIMEOUT", "30"))
+GEMINI_JOB_TIMEOUT = float(os.environ.get("GEMINI_JOB_TIMEOUT", "600"))
+# Upper bound for a single backoff delay when the server gives no hint
+GEMINI_MAX_BACKOFF = float(os.environ.get("GEMINI_MAX_BACKOFF", "60"))
+
+_RETRY_DELAY_PATTERNS = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry in\s+([\d.]+)\s*s", re.IGNORECASE),
+)
+
+class AsyncRateLimiter:
+    """
+    Token bucket shared by every event loop and thread in the process.
+
+    Callers reserve a token under a short thread lock and then sleep without
+    holding anything, so waiting never blocks the event loop or another loop.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, returning how many seconds the caller must wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1.0
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class RetryBudget:
+    """Process-wide retry throttle: retries are allowed only while the recent failure rate is low"""
+
+    def __init__(self, max_tokens=GEMINI_RETRY_BUDGET, token_ratio=GEMINI_RETRY_RATIO):
+        self.max_tokens = float(max_tokens)
+        self.token_ratio = float(token_ratio)
+        self.tokens = self.max_tokens
+        self.lock = threading.Lock()
+        self.stats = {"retries": 0, "denied": 0}
+
+    def record_success(self):
+        with self.lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.token_ratio)
+
+    def allow_retry(self):
+        """Record a failed call and decide whether it may be retried"""
+        with self.lock:
+            self.tokens = max(0.0, self.tokens - 1.0)
+            allowed = self.tokens > self.max_tokens / 2
+            self.stats["retries" if allowed else "denied"] += 1
+            return allowed
+
+_rate_limiter = None
+_retry_budget = None
+_shared_lock = threading.Lock()
+
+def get_gemini_rate_limiter():
+    """Return the process-wide Gemini rate limiter"""
+    global _rate_limiter
+    with _shared_lock:
+        if _rate_limiter is None:
+            _rate_limiter = AsyncRateLimiter(GEMINI_RPS)
+        return _rate_limiter
+
+def get_retry_budget():
+    """Return the process-wide Gemini retry budget"""
+    global _retry_budget
+    with _shared_lock:
+        if _retry_budget is None:
+            _retry_budget = RetryBudget()
+        return _retry_budget
+
+def retry_after_seconds(error) -> Optional[float]:
+    """Extract the server's retry hint from an API error, if it sent one"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers is not None and hasattr(headers, "get"):
+        value = headers.get("Retry-After")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    try:
+        details = getattr(error, "details", None) or []
+    except Exception:
+        details = []
+    for detail in details:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            seconds = getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+            if seconds > 0:
+                return seconds
+    for pattern in _RETRY_DELAY_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+class AsyncImagePromptGenerator:
+    """
+    asyncio counterpart of SequentialImagePromptGenerator.
+
+    Waiting for the API, for the rate limiter or for a backoff never blocks a
+    thread, so one event loop can drive many prompt jobs at once. All
+    instances share the process-wide rate limiter and retry budget.
+    """
+
+    def __init__(self, api_key: str = GOOGLE_API_KEY, rate_limiter: AsyncRateLimiter = None,
+                 retry_budget: RetryBudget = None, call_timeout: float = GEMINI_CALL_TIMEOUT):
+        if api_key is None:
+            raise ValueError("No API key provided. Set GOOGLE_API_KEY environment variable or pass directly.")
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        self.rate_limiter = rate_limiter or get_gemini_rate_limiter()
+        self.retry_budget = retry_budget or get_retry_budget()
+        self.call_timeout = call_timeout
+        self.api_calls = 0
+
+    async def _generate(self, content, generation_config=None):
+        kwargs = {"generation_config": generation_config} if generation_config is not None else {}
+        if hasattr(self.model, "generate_content_async"):
+            return await self.model.generate_content_async(content, **kwargs)
+        return await asyncio.to_thread(self.model.generate_content, content, **kwargs)
+
+    async def _call_api_with_retry(self, content, max_retries=6, base_delay=3.0, generation_config=None):
+        """Call the API with rate limiting, a per-call timeout and budgeted retries."""
+        retries = 0
+        while True:
+            await self.rate_limiter.acquire()
+            self.api_calls += 1
+            try:
+                response = await asyncio.wait_for(self._generate(content, generation_config), self.call_timeout)
+                self.retry_budget.record_success()
+                return response
+            except (ResourceExhausted, ServiceUnavailable, asyncio.TimeoutError) as e:
+                reason = "Timed out" if isinstance(e, asyncio.TimeoutError) else "Rate limit hit"
+                retries += 1
+                if retries > max_retries:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise Exception(f"Maximum retries exceeded. API call timed out after {self.call_timeout:g}s")
+                    raise Exception(f"Maximum retries exceeded. API quota limit reached: {e}")
+                if not self.retry_budget.allow_retry():
+                    raise Exception(f"Retry budget exhausted; not retrying: {reason.lower()} ({e})")
+
+                # Prefer the server's hint; otherwise exponential backoff with jitter
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = min(GEMINI_MAX_BACKOFF, base_delay * (2 ** retries)) + random.uniform(0, 1)
+                print(f"{reason}. Retrying in {delay:.1f} seconds... (Attempt {retries}/{max_retries})")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                raise Exception(f"API Error: {str(e)}")
+
+    async def generate_initial_prompt(self, scene_description: str, total_frames: int = 60) -> str:
+        """Generate the first prompt based on a general scene description."""
+        request = SequentialImagePromptGenerator._initial_prompt_request(scene_description, total_frames)
+        response = await self._call_api_with_retry(request)
+        return response.text.strip()
+
+    async def generate_next_prompt(self, previous_prompt: str, frame_number: int, total_frames: int = 60) -> str:
+        """Generate the next prompt in the sequence based on the previous one."""
+        request = SequentialImagePromptGenerator._next_prompt_request(previous_prompt, frame_number, total_frames)
+        response = await self._call_api_with_retry(request)
+        return response.text.strip()
+
+    async def iter_prompt_sequence(self, initial_scene: str, num_frames: int = 60,
+                                   start_prompts: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """Yield the prompts of a sequence one at a time, continuing from start_prompts if given."""
+        if start_prompts:
+            for prompt in start_prompts:
+                yield prompt
+            current_prompt = start_prompts[-1]
+        else:
+            current_prompt = await self.generate_initial_prompt(initial_scene)
+            yield current_prompt
+        for i in range(len(start_prompts or [None]) + 1, num_frames + 1):
+            try:
+                current_prompt = await self.generate_next_prompt(current_prompt, i, num_frames)
+            except Exception as e:
+                print(f"\nError generating frame {i}: {str(e)}")
+                print(f"Stopping sequence generation. {i - 1} frames were successfully generated.")
+                return
+            yield current_prompt
+
+    async def plan_keyframes(self, scene_description: str, num_keyframes: int, total_frames: int) -> Dict:
+        """Plan the whole sequence in one call: a shared style guide plus evenly spaced keyframe prompts."""
+        request = SequentialImagePromptGenerator._keyframe_plan_request(scene_description, num_keyframes, total_frames)
+        response = await self._call_api_with_retry(request, generation_config=JSON_RESPONSE)
+        return SequentialImagePromptGenerator._parse_keyframe_plan(response.text, num_keyframes)
+
+    async def generate_frame_batch(self, style: str, start_prompt: str, end_prompt: str, start_frame: int,
+                                   end_frame: int, first: int, count: int, total_frames: int) -> List[str]:
+        """Generate `count` in-between frames (starting at frame `first`) between two keyframes in one call."""
+        request = SequentialImagePromptGenerator._frame_batch_request(
+            style, start_prompt, end_prompt, start_frame, end_frame, first, count, total_frames
+        )
+        response = await self._call_api_with_retry(request, generation_config=JSON_RESPONSE)
+        return SequentialImagePromptGenerator._parse_frame_batch(response.text, count)
+
+    async def iter_keyframe_sequence(self, initial_scene: str, num_frames: int = 60,
+                                     keyframe_interval: int = KEYFRAME_INTERVAL, batch_size: int = FRAME_BATCH_SIZE,
+                                     max_concurrency: int = PROMPT_CONCURRENCY) -> AsyncIterator[str]:
+        """Yield a keyframe-planned sequence in frame order (see SequentialImagePromptGenerator.iter_keyframe_sequence)."""
+        if num_frames < 1:
+            return
+        positions, segments = keyframe_layout(num_frames, keyframe_interval, batch_size)
+        plan = await self.plan_keyframes(initial_scene, len(positions), num_frames)
+        style, keyframes = plan["style"], plan["keyframes"]
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def interpolate(k, first, count):
+            async with semaphore:
+                start, end = positions[k], positions[k + 1]
+                try:
+                    return await self.generate_frame_batch(style, keyframes[k], keyframes[k + 1], start + 1, end + 1,
+                                                           first + 1, count, num_frames)
+                except Exception as e:
+                    print(f"Batch for frames {first + 1}-{first + count} failed ({e}); generating them one by one.")
+                    frames, previous = [], keyframes[k]
+                    for i in range(first, first + count):
+                        previous = await self.generate_next_prompt(previous, i + 1, num_frames)
+                        frames.append(previous)
+                    return frames
+
+        tasks = [[asyncio.ensure_future(interpolate(k, first, count)) for first, count in jobs]
+                 for k, jobs in enumerate(segments)]
+        try:
+            yield keyframes[0]
+            for k, segment in enumerate(tasks):
+                for task in segment:
+                    try:
+                        frames = await task
+                    except Exception as e:
+                        print(f"\nError generating frames after frame {positions[k] + 1}: {str(e)}")
+                        return
+                    for frame in frames:
+                        yield frame
+                yield keyframes[k + 1]
+        finally:
+            for segment in tasks:
+                for task in segment:
+                    task.cancel()
+
+async def generate_video_prompts_async(scene_description: str, num_frames: int = 60, api_key: str = GOOGLE_API_KEY,
+                                       mode: str = "sequential", job_timeout: float = GEMINI_JOB_TIMEOUT,
+                                       use_store: bool = True) -> List[str]:
+    """
+    Generate a prompt sequence without blocking a thread.
+
+    Args:
+        scene_description: A description of the scene you want to create
+        num_frames: Number of sequential frames to generate (default: 60)
+        api_key: Google API key for Gemini (optional if set as environment variable)
+        mode: "sequential" or "keyframes" (see generate_video_prompts)
+        job_timeout: Seconds for the whole job; the prompts generated so far are returned when it expires
+        use_store: Reuse or extend sequences from the prompt store and save new ones to it
+
+    Returns:
+        List of image prompts
+    """
+    if mode not in PROMPT_MODES:
+        raise ValueError(f"Unknown prompt mode '{mode}'. Choose one of: {', '.join(PROMPT_MODES)}")
+    store = get_prompt_store() if use_store else None
+    if store is not None:
+        found = store.get(scene_description, num_frames, GEMINI_MODEL, mode)
+        if found is not None:
+            return found[1]
+    prompts = []
+    try:
+        generator = AsyncImagePromptGenerator(api_key)
+        stored = store.find_extendable(scene_description, num_frames, GEMINI_MODEL, mode) if store and mode == "sequential" else None
+        if stored:
+            sequence = generator.iter_prompt_sequence(scene_description, num_frames, start_prompts=stored)
+        elif mode == "keyframes":
+            sequence = generator.iter_keyframe_sequence(scene_description, num_frames)
+        else:
+            sequence = generator.iter_prompt_sequence(scene_description, num_frames)
+
+        async def collect():
+            async for prompt in sequence:
+                prompts.append(prompt)
+
+        await asyncio.wait_for(collect(), job_timeout)
+        print(f"Generated {len(prompts)} prompts with {generator.api_calls} API calls")
+    except asyncio.TimeoutError:
+        print(f"Prompt job timed out after {job_timeout:g}s with {len(prompts)} of {num_frames} prompts")
+    except Exception as e:
+        print(f"Error generating video prompts: {str(e)}")
+    if prompts and store is not None:
+        store.put(scene_description, prompts, GEMINI_MODEL, mode, num_frames)
+    return prompts
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import codecs
+import hashlib
+import logging
+import threading
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from modules.metrics import register_provider
+
+logger = logging.getLogger(__name__)
+
+COURSES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "courses.json")
+# Seconds between file stat checks; requests in between reuse the current snapshot
+CATALOG_CHECK_INTERVAL = float(os.environ.get("CATALOG_CHECK_INTERVAL", "2"))
+# Catalogs larger than this many bytes are parsed incrementally instead of with json.load
+CATALOG_STREAMING_THRESHOLD = int(os.environ.get("CATALOG_STREAMING_THRESHOLD", str(64 * 1024 * 1024)))
+
+_READ_SIZE = 1 << 20
+# Low-cardinality fields whose strings are interned so thousands of courses share one object
+_INTERNED_FIELDS = ("difficulty", "duration")
+
+
+def _read_text(f: BinaryIO, digest) -> Iterator[str]:
+    """Yield decoded text chunks from a binary file while hashing the raw bytes."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for block in iter(lambda: f.read(_READ_SIZE), b""):
+        digest.update(block)
+        yield decoder.decode(block)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_json_array(f: BinaryIO, digest) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array, yielding one element at a time.
+
+    Only the current chunk and the element being decoded are held in memory,
+    so very large catalogs never exist as one giant string.
+    """
+    decoder = json.JSONDecoder()
+    chunks = _read_text(f, digest)
+    buffer, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip(separators: str) -> Optional[str]:
+        """Skip whitespace and separators, returning the next significant character."""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in separators):
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return None
+
+    if skip("") != "[":
+        raise ValueError("Catalog must be a JSON array of courses")
+    pos += 1
+
+    while True:
+        char = skip(",")
+        if char is None:
+            raise ValueError("Unexpected end of catalog file")
+        if char == "]":
+            # Drain the rest of the file so the content hash covers every byte
+            for _ in chunks:
+                pass
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A value that ends exactly at the buffer edge may be truncated
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            if not fill():
+                continue
+        pos = end
+        yield item
+
+
+def _compact(course: Dict[str, Any]) -> Dict[str, Any]:
+    """Intern repeated short strings so identical values share memory."""
+    for field in _INTERNED_FIELDS:
+        value = course.get(field)
+        if isinstance(value, str):
+            course[field] = sys.intern(value)
+    return course
+
+
+class CatalogSnapshot:
+    """A fully parsed version of the catalog file; its course list is never mutated."""
+
+    __slots__ = ("path", "courses", "content_hash", "mtime_ns", "size_bytes", "load_seconds", "loaded_at", "version")
+
+    def __init__(self, path: str, courses: List[Dict[str, Any]], content_hash: str,
+                 mtime_ns: int, size_bytes: int, load_seconds: float, version: int):
+        self.path = path
+        self.courses = courses
+        self.content_hash = content_hash
+        self.mtime_ns = mtime_ns
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.version = version
+
+
+def parse_catalog(path: str, streaming: Optional[bool] = None) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Parse a catalog file and hash its contents in the same pass.
+
+    Args:
+        path: Path to a JSON array (or .jsonl, one course per line) catalog
+        streaming: Force the incremental parser on or off (default: by file size)
+
+    Returns:
+        Tuple of (courses, content_hash)
+    """
+    if streaming is None:
+        streaming = os.path.getsize(path) > CATALOG_STREAMING_THRESHOLD
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        if path.endswith(".jsonl"):
+            courses = []
+            for line in f:
+                digest.update(line)
+                if line.strip():
+                    courses.append(_compact(json.loads(line)))
+        elif streaming:
+            courses = [_compact(course) for course in iter_json_array(f, digest)]
+        else:
+            data = f.read()
+            digest.update(data)
+            courses = [_compact(course) for course in json.loads(data)]
+    return courses, digest.hexdigest()
+
+
+class CatalogStore:
+    """
+    Keeps the parsed catalog in memory and swaps in new versions when the file changes.
+
+    Readers always get a complete snapshot. A reload happens in whichever
+    request notices the change first; concurrent readers keep using the
+    previous snapshot instead of waiting for the reload.
+    """
+
+    def __init__(self, path: str = COURSES_PATH, check_interval: float = CATALOG_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self) -> CatalogSnapshot:
+        """Return the current snapshot, reloading first if the file changed."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+
+        if snapshot is None:
+            # Nothing to serve yet, so the first caller must wait for the initial load
+            with self._reload_lock:
+                if self._snapshot is None:
+                    self._reload()
+                return self._snapshot
+
+        if not self._reload_lock.acquire(blocking=False):
+            return snapshot
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                stat = os.stat(self.path)
+                if stat.st_mtime_ns != snapshot.mtime_ns or stat.st_size != snapshot.size_bytes:
+                    self._reload()
+            except Exception as e:
+                # A half-written or deleted file must not take down serving; keep the last good version
+                logger.error(f"Error reloading catalog, keeping v{snapshot.version}: {str(e)}")
+            return self._snapshot
+        finally:
+            self._reload_lock.release()
+
+    def _reload(self) -> None:
+        start = time.perf_counter()
+        stat = os.stat(self.path)
+        courses, content_hash = parse_catalog(self.path)
+        current = self._snapshot
+        if current is not None and current.content_hash == content_hash:
+            # Touched but unchanged: keep the same snapshot so dependent caches stay valid
+            current.mtime_ns, current.size_bytes = stat.st_mtime_ns, stat.st_size
+            return
+
+        load_seconds = time.perf_counter() - start
+        version = current.version + 1 if current is not None else 1
+        self._snapshot = CatalogSnapshot(self.path, courses, content_hash, stat.st_mtime_ns,
+                                         stat.st_size, load_seconds, version)
+        self._next_check = time.monotonic() + self.check_interval
+        self.reloads += 1
+        logger.info(f"Loaded catalog v{version}: {len(courses)} courses, {stat.st_size} bytes in {load_seconds:.3f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return load time and size of the current snapshot."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"path": self.path, "loaded": False}
+        return {
+            "path": self.path,
+            "loaded": True,
+            "version": snapshot.version,
+            "courses": len(snapshot.courses),
+            "size_bytes": snapshot.size_bytes,
+            "load_seconds": round(snapshot.load_seconds, 4),
+            "loaded_at": snapshot.loaded_at,
+            "content_hash": snapshot.content_hash,
+            "reloads": self.reloads
+        }
+
+
+_stores: Dict[str, CatalogStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_catalog(path: str = COURSES_PATH) -> CatalogSnapshot:
+    """Return the current catalog snapshot for ``path``."""
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = CatalogStore(path)
+                _stores[path] = store
+                register_provider("catalog" if path == COURSES_PATH else f"catalog:{path}", store.stats)
+    return store.get()
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from modules.catalog import COURSES_PATH, get_catalog
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 384
+
+# In-process copy of each model's store so requests only touch disk when the catalog changes
+_stores: Dict[str, Dict[str, Any]] = {}
+_store_lock = threading.Lock()
+# Models whose store is being rebuilt for a changed catalog
+_rebuilding: Set[str] = set()
+# Seconds before a catalog whose background rebuild failed is tried again
+REBUILD_RETRY_INTERVAL = 60.0
+# Per model, the catalog signature whose last rebuild failed and when it may be retried
+_failed_rebuilds: Dict[str, Tuple[Tuple[str, str], float]] = {}
+
+
+class EmbeddingUnavailableError(RuntimeError):
+    """Raised when the embedding model cannot produce vectors."""
+
+
+def course_text(course: Dict[str, Any]) -> str:
+    """Build the text that represents a course for embedding."""
+    return f"{course.get('title', '')} {course.get('description', '')} " \
+           f"{' '.join(course.get('skills_covered', []))} " \
+           f"{course.get('difficulty', '')}"
+
+
+def store_paths(courses_path: str) -> Tuple[str, str]:
+    """Return the (matrix, metadata) paths stored next to the catalog."""
+    base, _ = os.path.splitext(courses_path)
+    return f"{base}.embeddings.npy", f"{base}.embeddings.json"
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a matrix as float32."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _read_store(matrix_path: str, meta_path: str, content_hash: str, model_name: str, count: int) -> Optional[np.ndarray]:
+    """Load a persisted matrix if it matches the catalog hash and model."""
+    if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta.get("catalog_hash") != content_hash or meta.get("model") != model_name:
+            logger.info("Course embedding store is stale, rebuilding")
+            return None
+        matrix = np.load(matrix_path)
+        if matrix.shape[0] != count:
+            logger.info("Course embedding store size mismatch, rebuilding")
+            return None
+        return matrix
+    except Exception as e:
+        logger.warning(f"Could not read course embedding store: {str(e)}")
+        return None
+
+
+def _write_store(matrix: np.ndarray, matrix_path: str, meta_path: str, content_hash: str, model_name: str) -> None:
+    """Persist the matrix and its metadata, replacing any previous store atomically."""
+    tmp_matrix = f"{matrix_path}.tmp"
+    tmp_meta = f"{meta_path}.tmp"
+    with open(tmp_matrix, "wb") as f:
+        np.save(f, matrix)
+    with open(tmp_meta, "w") as f:
+        json.dump({
+            "catalog_hash": content_hash,
+            "model": model_name,
+            "count": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0
+        }, f, indent=2)
+    os.replace(tmp_matrix, matrix_path)
+    os.replace(tmp_meta, meta_path)
+
+
+def _build_store(
+    catalog: Any,
+    encode_texts: Callable[[List[str]], Optional[np.ndarray]],
+    model_name: str,
+    courses_path: str,
+    persist: bool,
+    prepare: Optional[Callable[[np.ndarray], Any]]
+) -> Dict[str, Any]:
+    """Read or embed the matrix for a catalog snapshot and run prepare on it."""
+    courses = catalog.courses
+    content_hash = catalog.content_hash
+    matrix_path, meta_path = store_paths(courses_path)
+
+    matrix = _read_store(matrix_path, meta_path, content_hash, model_name, len(courses)) if persist else None
+    if matrix is None:
+        logger.info(f"Embedding {len(courses)} courses with {model_name}")
+        matrix = encode_texts([course_text(course) for course in courses])
+        if matrix is None:
+            raise EmbeddingUnavailableError(f"Could not embed the course catalog with {model_name}")
+        matrix = normalize_rows(matrix) if len(courses) else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        if persist:
+            try:
+                _write_store(matrix, matrix_path, meta_path, content_hash, model_name)
+                logger.info(f"Saved course embedding store to {matrix_path}")
+            except Exception as e:
+                logger.warning(f"Could not save course embedding store: {str(e)}")
+
+    if prepare is not None:
+        try:
+            prepare(matrix)
+        except Exception as e:
+            logger.warning(f"Could not prepare course embeddings: {str(e)}")
+
+    return {"signature": (courses_path, content_hash), "courses": courses, "matrix": matrix}
+
+
+def _rebuild_store(
+    catalog: Any,
+    encode_texts: Callable[[List[str]], Optional[np.ndarray]],
+    model_name: str,
+    courses_path: str,
+    persist: bool,
+    prepare: Optional[Callable[[np.ndarray], Any]]
+) -> None:
+    """Build the store for a changed catalog in the background, then swap it in."""
+    store = None
+    try:
+        store = _build_store(catalog, encode_texts, model_name, courses_path, persist, prepare)
+    except Exception as e:
+        logger.error(f"Error rebuilding course embeddings, keeping the previous catalog "
+                     f"for {REBUILD_RETRY_INTERVAL:g}s: {str(e)}")
+    finally:
+        with _store_lock:
+            if store is not None:
+                _stores[model_name] = store
+                _failed_rebuilds.pop(model_name, None)
+            else:
+                # Without this, every request would start another full re-embed of the same catalog
+                signature = (courses_path, catalog.content_hash)
+                _failed_rebuilds[model_name] = (signature, time.monotonic() + REBUILD_RETRY_INTERVAL)
+            _rebuilding.discard(model_name)
+    if store is not None:
+        logger.info(f"Swapped in course embeddings for catalog v{catalog.version}")
+
+
+def load_course_embeddings(
+    encode_texts: Callable[[List[str]], Optional[np.ndarray]],
+    model_name: str,
+    courses_path: str = COURSES_PATH,
+    persist: bool = True,
+    prepare: Optional[Callable[[np.ndarray], Any]] = None
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Return the catalog and its normalized float32 embedding matrix.
+
+    The catalog comes from the in-memory catalog store. The matrix is read
+    from disk next to the catalog and rebuilt whenever the catalog's content
+    hash or the embedding model changes.
+
+    The first load waits for the matrix. When the catalog changes later, one
+    background thread re-embeds it while callers keep getting the previous
+    (courses, matrix) pair, which is swapped out once the new one is ready.
+    If that rebuild fails, the same catalog is not retried for
+    REBUILD_RETRY_INTERVAL seconds.
+
+    Args:
+        encode_texts: Callable that embeds a list of texts, returning None on failure
+        model_name: Name of the embedding model, recorded with the store
+        courses_path: Path to the courses JSON catalog
+        persist: Whether to read and write the on-disk store; cheap embedders
+            such as the fallback only keep the matrix in memory
+        prepare: Optional callable run on each new matrix before it is
+            returned or swapped in, e.g. to build a search index for it
+
+    Returns:
+        Tuple of (courses, matrix) where matrix row i embeds courses[i]
+
+    Raises:
+        EmbeddingUnavailableError: If the catalog needs embedding and encode_texts fails
+    """
+    catalog = get_catalog(courses_path)
+    signature = (courses_path, catalog.content_hash)
+
+    store = _stores.get(model_name)
+    if store is not None and store["signature"] == signature:
+        return store["courses"], store["matrix"]
+
+    with _store_lock:
+        store = _stores.get(model_name)
+        if store is not None and store["signature"] != signature and store["signature"][0] == courses_path:
+            failed = _failed_rebuilds.get(model_name)
+            retry_later = failed is not None and failed[0] == signature and time.monotonic() < failed[1]
+            if model_name not in _rebuilding and not retry_later:
+                _rebuilding.add(model_name)
+                threading.Thread(
+                    target=_rebuild_store,
+                    args=(catalog, encode_texts, model_name, courses_path, persist, prepare),
+                    name="course-embeddings",
+                    daemon=True
+                ).start()
+            return store["courses"], store["matrix"]
+        if store is not None and store["signature"] == signature:
+            return store["courses"], store["matrix"]
+
+        # Nothing to serve yet, so the first caller builds the store and the others wait for it
+        store = _build_store(catalog, encode_texts, model_name, courses_path, persist, prepare)
+        _stores[model_name] = store
+        return store["courses"], store["matrix"]
@@ -1,9 +1,28 @@
+import os
+import time
+import logging
+import numpy as np
 import pandas as pd
 
+# Rows per chunk when cleaning a CSV as a stream; peak memory grows with this, not with the file size
+PREPROCESS_CHUNK_ROWS = int(os.environ.get("PREPROCESS_CHUNK_ROWS", "100000"))
+# File formats the cleaned data can be written in; parquet and feather need pyarrow
+OUTPUT_FORMATS = ("csv", "parquet", "feather")
+PREPROCESS_OUTPUT_FORMAT = os.environ.get("PREPROCESS_OUTPUT_FORMAT", "csv")
+# A text column becomes categorical if it has at most this many distinct values...
+CATEGORY_MAX_VALUES = int(os.environ.get("PREPROCESS_CATEGORY_MAX_VALUES", "1000"))
+# ...and they number at most this share of its rows
+CATEGORY_MAX_RATIO = float(os.environ.get("PREPROCESS_CATEGORY_MAX_RATIO", "0.5"))
+
+_INTEGER_DTYPES = (np.int8, np.int16, np.int32, np.int64, np.uint64)
+
+logger = logging.getLogger(__name__)
+
 def clean_and_preprocess_data(file_path):
     """
     Loads CSV data, cleans and preprocesses it.
     Replace the dummy cleaning logic with your own processing steps.
+    Loads the whole file into memory; use clean_csv_stream for large files.
     """
     try:
         df = pd.read_csv(file_path)
@@ -13,3 +32,243 @@ def clean_and_preprocess_data(file_path):
         return df
     except Exception as e:
         raise ValueError(f"Error processing data: {e}")
+
+class ColumnProfile:
+    """
+    Running summary of one column, fed chunk by chunk, that picks its most
+    compact lossless dtype: the smallest integer type holding its range, float32
+    when every value survives the round trip, a categorical for text with few
+    distinct values, and object (plain text) otherwise. Text counts as numeric
+    only if every value converts back to exactly the original string.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.missing = False
+        self.numeric = True
+        self.integer = True
+        self.float32_exact = True
+        self.min = None
+        self.max = None
+        # Distinct values, until there are too many for a categorical
+        self.values = set()
+
+    def update(self, series):
+        self.rows += len(series)
+        values = series.dropna()
+        self.missing = self.missing or len(values) < len(series)
+        if self.values is not None:
+            distinct = values.unique()
+            if len(distinct) > CATEGORY_MAX_VALUES:
+                self.values = None
+            else:
+                self.values.update(distinct)
+                if len(self.values) > CATEGORY_MAX_VALUES:
+                    self.values = None
+        if not self.numeric or values.empty:
+            return
+        if pd.api.types.is_numeric_dtype(values):
+            numbers = values
+        else:
+            try:
+                # Raising stops at the first non-number, so text columns are rejected cheaply
+                numbers = pd.to_numeric(values)
+            except (ValueError, TypeError):
+                numbers = None
+            # Text is only numeric if every value reads back exactly as written, so codes
+            # like "007" and spellings like "1.50" or "1e3" stay text
+            if numbers is not None and not (numbers.astype(str) == values.astype(str)).all():
+                numbers = None
+        if numbers is None or pd.api.types.is_bool_dtype(numbers):
+            self.numeric = False
+            return
+        self.integer = self.integer and numbers.dtype.kind in "iu"
+        # Checked on integer chunks too: a later chunk can turn the column to float
+        if self.float32_exact:
+            self.float32_exact = bool((numbers.astype(np.float32).astype(np.float64) == numbers).all())
+        low, high = numbers.min(), numbers.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def dtype(self):
+        if not self.rows or self.min is None and self.numeric:
+            return np.dtype(object)
+        if self.numeric:
+            if self.integer and not self.missing:
+                for dtype in _INTEGER_DTYPES:
+                    info = np.iinfo(dtype)
+                    if info.min <= self.min and self.max <= info.max:
+                        return np.dtype(dtype)
+            return np.dtype(np.float32 if self.float32_exact else np.float64)
+        if self.values is not None and len(self.values) <= CATEGORY_MAX_RATIO * self.rows:
+            return pd.CategoricalDtype(sorted(self.values))
+        return np.dtype(object)
+
+def infer_dtypes(chunks):
+    """Profile an iterable of DataFrames with the same columns; returns {column: compact dtype}"""
+    profiles = {}
+    for chunk in chunks:
+        for column in chunk.columns:
+            profiles.setdefault(column, ColumnProfile()).update(chunk[column])
+    return {column: profile.dtype() for column, profile in profiles.items()}
+
+def apply_dtypes(df, dtypes):
+    """Convert df's columns (text or already typed) to the dtypes chosen by infer_dtypes"""
+    converted = {}
+    for column, dtype in dtypes.items():
+        series = df[column]
+        if dtype.kind in "iuf" and not pd.api.types.is_numeric_dtype(series):
+            series = pd.to_numeric(series)
+        converted[column] = series.astype(dtype)
+    return pd.DataFrame(converted, index=df.index)
+
+def optimize_dtypes(df):
+    """Return df with compact dtypes: downcast numerics and categoricals for low-cardinality text"""
+    # Booleans, datetimes and existing categoricals are already compact
+    candidates = [column for column in df.columns if df[column].dtype.kind in "iufO"]
+    df = df.copy()
+    df[candidates] = apply_dtypes(df[candidates], infer_dtypes([df[candidates]]))
+    return df
+
+def describe_dtypes(dtypes):
+    """JSON-friendly names of a {column: dtype} mapping"""
+    return {column: "category" if isinstance(dtype, pd.CategoricalDtype) else str(dtype) for column, dtype in dtypes.items()}
+
+class RowHashSet:
+    """
+    Set of 64-bit row hashes, stored as a few sorted numpy runs (8 bytes per row).
+
+    New hashes are added as a sorted run; runs of similar size are merged, so
+    there are O(log n) runs and each lookup is a binary search per run.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def add(self, hashes):
+        """Add hashes; returns a mask of those not seen before (the first of repeats within `hashes` counts as new)"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        new = np.zeros(len(hashes), dtype=bool)
+        new[np.unique(hashes, return_index=True)[1]] = True
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            new &= run[positions] != hashes
+        run = np.sort(hashes[new])
+        while self.runs and len(self.runs[-1]) <= 2 * len(run):
+            run = np.sort(np.concatenate([self.runs.pop(), run]))
+        if len(run):
+            self.runs.append(run)
+        return new
+
+def check_output_format(output_format):
+    """
+    Raise ValueError if output_format is unknown, or is columnar and pyarrow
+    cannot be imported, so callers can reject a request before cleaning starts
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose one of: {', '.join(OUTPUT_FORMATS)}")
+    if output_format != "csv":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as e:
+            raise ValueError(f"{output_format} output needs pyarrow, which cannot be imported: {e}")
+
+def _write_columnar(csv_path, output_path, output_format, dtypes, chunk_rows):
+    """Rewrite a cleaned text CSV as Parquet or Feather, chunk by chunk, with the given dtypes"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+            table = pa.Table.from_pandas(apply_dtypes(chunk, dtypes), preserve_index=False)
+            if writer is None:
+                if output_format == "parquet":
+                    writer = pq.ParquetWriter(output_path, table.schema, compression="snappy")
+                else:
+                    # Feather is left uncompressed so readers can memory-map it without decoding
+                    writer = pa.ipc.new_file(output_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+def clean_csv_stream(file_path, output_path, chunk_rows=PREPROCESS_CHUNK_ROWS, output_format="csv"):
+    """
+    Clean a CSV chunk by chunk: the same cleaning as clean_and_preprocess_data
+    (rows with missing values and repeated rows removed, first occurrence kept,
+    order preserved), without loading the file into memory. file_path may
+    also be a binary file object, such as an upload stream.
+
+    Values are kept as text, so cells are compared and written exactly as they
+    appear in the input. Duplicates across chunks are found through a 64-bit
+    hash of each kept row (see RowHashSet), so memory is one chunk plus 8 bytes
+    per unique row. Cleaned chunks are appended to a temporary file that
+    replaces output_path when the whole input has been read.
+
+    With output_format "parquet" or "feather", the columns are profiled while
+    cleaning, and a second pass over the cleaned rows writes them with compact
+    dtypes (see ColumnProfile) in that format. Parquet is snappy-compressed and
+    smallest; Feather is uncompressed and loads fastest memory-mapped.
+
+    Returns:
+        Dict with rows read and written, duplicates and incomplete rows removed,
+        seconds taken, rows per second and, for columnar output, the column dtypes
+    """
+    check_output_format(output_format)
+    start = time.perf_counter()
+    seen = RowHashSet()
+    profiles = {} if output_format != "csv" else None
+    stats = {"rows_read": 0, "rows_written": 0, "duplicates": 0, "incomplete": 0, "chunks": 0}
+    tmp_path = f"{output_path}.tmp"
+    csv_path = tmp_path if output_format == "csv" else f"{output_path}.csv.tmp"
+    try:
+        with open(csv_path, "w", newline="") as out:
+            for i, chunk in enumerate(pd.read_csv(file_path, dtype=str, chunksize=chunk_rows)):
+                complete = chunk.dropna()
+                keep = seen.add(pd.util.hash_pandas_object(complete, index=False).to_numpy())
+                kept = complete[keep]
+                kept.to_csv(out, header=(i == 0), index=False)
+                if profiles is not None:
+                    for column in kept.columns:
+                        profiles.setdefault(column, ColumnProfile()).update(kept[column])
+                stats["chunks"] += 1
+                stats["rows_read"] += len(chunk)
+                stats["incomplete"] += len(chunk) - len(complete)
+                stats["duplicates"] += len(complete) - int(keep.sum())
+                stats["rows_written"] += int(keep.sum())
+        if profiles is not None:
+            dtypes = {column: profile.dtype() for column, profile in profiles.items()}
+            _write_columnar(csv_path, tmp_path, output_format, dtypes, chunk_rows)
+            stats["dtypes"] = describe_dtypes(dtypes)
+        os.replace(tmp_path, output_path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise ValueError(f"Error processing data: {e}")
+    finally:
+        if csv_path != tmp_path and os.path.exists(csv_path):
+            os.remove(csv_path)
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    stats["rows_per_second"] = round(stats["rows_read"] / max(stats["seconds"], 1e-9))
+    logger.info(f"Cleaned {stats['rows_read']} rows into {stats['rows_written']} in {stats['seconds']:.1f}s "
+                f"({stats['rows_per_second']} rows/s, {stats['duplicates']} duplicates, {stats['incomplete']} incomplete)")
+    return stats
+
+def load_cleaned_data(path, columns=None):
+    """
+    Load preprocessing output into a DataFrame, choosing the reader by extension.
+    Parquet and Feather files are memory-mapped and keep the dtypes they were
+    written with; CSV is read as text and given the same compact dtypes.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".feather":
+        import pyarrow.feather as feather
+        return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    if extension == ".parquet":
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    return optimize_dtypes(pd.read_csv(path, usecols=columns, dtype=str))
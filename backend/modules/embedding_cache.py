@@ -0,0 +1,144 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+# Seconds an entry stays valid; 0 keeps entries until they are evicted
+EMBEDDING_CACHE_TTL = float(os.environ.get("EMBEDDING_CACHE_TTL", "0"))
+# SQLite file for the on-disk tier; empty disables it
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace and case so equivalent answers share one cache entry."""
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def cache_key(text: str, model_name: str) -> str:
+    """Hash the normalized text together with the model that embeds it."""
+    return hashlib.sha256(f"{model_name}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings with an optional TTL and SQLite disk tier.
+
+    Lookups check memory first, then disk; disk hits are promoted into
+    memory. Counters for hits, misses and evictions are kept for metrics.
+    The SQLite connection is opened on first use in each process, because a
+    connection must not be used across fork (e.g. into pre-forked gunicorn
+    workers when the app is preloaded in the master).
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl_seconds: float = EMBEDDING_CACHE_TTL,
+                 disk_path: Optional[str] = EMBEDDING_CACHE_PATH or None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        self.disk_path = disk_path
+        self._db = None
+        self._db_pid = None
+        # Connection inherited from the parent after a fork; kept unused and unclosed
+        self._inherited_db = None
+
+    def _disk(self) -> Optional[sqlite3.Connection]:
+        """Return this process's disk tier connection, opening it on first use; call with _lock held."""
+        if not self.disk_path:
+            return None
+        if self._db_pid != os.getpid():
+            if self._db is not None:
+                self._inherited_db = self._db
+            self._db = None
+            self._db_pid = os.getpid()
+            try:
+                directory = os.path.dirname(self.disk_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                db = sqlite3.connect(self.disk_path, check_same_thread=False)
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)"
+                )
+                db.commit()
+                self._db = db
+            except Exception as e:
+                logger.warning(f"Embedding disk cache disabled: {str(e)}")
+        return self._db
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached vector for ``key`` or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, created = entry
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return vector
+                del self._entries[key]
+                self.counters["expired"] += 1
+
+            db = self._disk()
+            if db is not None:
+                row = db.execute("SELECT vector, created FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._store(key, vector, row[1])
+                    self.counters["disk_hits"] += 1
+                    return vector
+
+            self.counters["misses"] += 1
+            return None
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        """Cache a vector in memory and, if enabled, on disk."""
+        vector = np.asarray(vector, dtype=np.float32)
+        vector.setflags(write=False)
+        created = time.time()
+        with self._lock:
+            self._store(key, vector, created)
+            db = self._disk()
+            if db is not None:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)",
+                        (key, vector.tobytes(), created)
+                    )
+                    db.commit()
+                except Exception as e:
+                    logger.warning(f"Could not write embedding to disk cache: {str(e)}")
+
+    def _store(self, key: str, vector: np.ndarray, created: float) -> None:
+        self._entries[key] = (vector, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters, current size and hit rate."""
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+            disk_tier = self._disk() is not None
+        lookups = counters["hits"] + counters["disk_hits"] + counters["misses"]
+        hit_rate = (counters["hits"] + counters["disk_hits"]) / lookups if lookups else 0.0
+        return {**counters, "size": size, "max_entries": self.max_entries,
+                "disk_tier": disk_tier, "hit_rate": round(hit_rate, 4)}
@@ -0,0 +1,92 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", "5"))
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces texts from concurrent callers into micro-batches for one encoder.
+
+    Each caller submits a single text and blocks on its own future. A
+    background thread collects texts until the batch is full or the wait
+    window since the first text has passed, encodes them in one call and
+    hands every caller its own row.
+    """
+
+    def __init__(self, encode_batch: Callable[[List[str]], np.ndarray],
+                 max_batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        self.encode_batch = encode_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.stats = {"texts": 0, "batches": 0}
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for embedding and return a future for its vector."""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> np.ndarray:
+        """Embed one text, blocking until its batch has been encoded."""
+        return self.submit(text).result(timeout=timeout)
+
+    def close(self) -> None:
+        """Stop the background thread after the queued texts are encoded."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first: Tuple[str, Future]) -> Tuple[List[Tuple[str, Future]], bool]:
+        """Gather a batch starting with ``first``; returns (batch, stop_requested)."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._collect(first)
+
+            # Callers may have given up (cancelled) while waiting in the queue
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                vectors = np.asarray(self.encode_batch([text for text, _ in batch]))
+            except Exception as e:
+                logger.error(f"Error encoding embedding batch of {len(batch)}: {str(e)}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.stats["texts"] += len(batch)
+            self.stats["batches"] += 1
+            for row, (_, future) in enumerate(batch):
+                future.set_result(vectors[row])
@@ -0,0 +1,77 @@
+import os
+
+# Named output profiles. crf trades quality for size (lower is better and larger),
+# preset trades encode speed for compression, gop is the keyframe interval in frames,
+# max_height caps the output resolution, resample is the PIL filter used when frames
+# are scaled, and threads=0 lets ffmpeg use every core.
+ENCODING_PROFILES = {
+    "preview": {
+        "description": "Fastest encode for quick checks; small and low quality",
+        "codec": "libx264", "crf": 32, "preset": "ultrafast", "max_height": 480, "resample": "bilinear",
+        "threads": 0, "gop": 48, "audio_bitrate": "96k"
+    },
+    "standard": {
+        "description": "Balanced default, matching the previous hard-coded settings",
+        "codec": "libx264", "crf": 23, "preset": "medium", "max_height": None,
+        "threads": 4, "gop": 250, "audio_bitrate": "128k"
+    },
+    "mobile": {
+        "description": "Low-bandwidth delivery: 480p, capped bitrate, frequent keyframes, fast start",
+        "codec": "libx264", "crf": 28, "preset": "veryfast", "max_height": 480,
+        "threads": 0, "gop": 48, "maxrate": "600k", "bufsize": "1200k", "audio_bitrate": "64k",
+        "faststart": True
+    },
+    "archive": {
+        "description": "High quality master copy; slow encode, large file",
+        "codec": "libx264", "crf": 18, "preset": "slow", "max_height": None,
+        "threads": 0, "gop": 250, "audio_bitrate": "192k"
+    },
+}
+DEFAULT_ENCODING_PROFILE = os.environ.get("VIDEO_PROFILE", "standard")
+# Overrides every profile's thread count, e.g. to leave cores free on a shared render box
+VIDEO_ENCODE_THREADS = os.environ.get("VIDEO_ENCODE_THREADS")
+
+def get_profile(name=None):
+    """Return the settings of a named profile (default: VIDEO_PROFILE or 'standard')"""
+    name = name or DEFAULT_ENCODING_PROFILE
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}'. Choose one of: {', '.join(ENCODING_PROFILES)}")
+    profile = dict(ENCODING_PROFILES[name], name=name)
+    if VIDEO_ENCODE_THREADS:
+        profile["threads"] = int(VIDEO_ENCODE_THREADS)
+    return profile
+
+def profile_size(profile, size):
+    """Scale (width, height) down to the profile's max_height, keeping the aspect ratio and even dimensions"""
+    width, height = size
+    max_height = profile.get("max_height")
+    if max_height and height > max_height:
+        width, height = round(width * max_height / height), max_height
+    return (width - width % 2, height - height % 2)
+
+def ffmpeg_video_args(profile):
+    """ffmpeg output options for the profile's video stream"""
+    args = [
+        "-c:v", profile["codec"], "-preset", profile["preset"], "-crf", str(profile["crf"]),
+        "-g", str(profile["gop"]), "-pix_fmt", "yuv420p", "-threads", str(profile["threads"])
+    ]
+    if profile.get("maxrate"):
+        args += ["-maxrate", profile["maxrate"], "-bufsize", profile["bufsize"]]
+    if profile.get("faststart"):
+        args += ["-movflags", "+faststart"]
+    return args
+
+def moviepy_write_kwargs(profile):
+    """Keyword arguments for moviepy's write_videofile that apply the profile"""
+    extra = ["-crf", str(profile["crf"]), "-g", str(profile["gop"]), "-pix_fmt", "yuv420p"]
+    if profile.get("maxrate"):
+        extra += ["-maxrate", profile["maxrate"], "-bufsize", profile["bufsize"]]
+    if profile.get("faststart"):
+        extra += ["-movflags", "+faststart"]
+    return {
+        "codec": profile["codec"],
+        "preset": profile["preset"],
+        "threads": profile["threads"],
+        "audio_bitrate": profile["audio_bitrate"],
+        "ffmpeg_params": extra
+    }
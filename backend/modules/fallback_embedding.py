@@ -0,0 +1,68 @@
+import re
+import zlib
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+
+# Name recorded alongside fallback vectors so they are never mixed with model vectors
+FALLBACK_MODEL_NAME = "fallback-ngram-hashing-384"
+FALLBACK_DIM = 384
+
+_WORD = re.compile(r"\w+")
+# Whole words carry more meaning than the character trigrams inside them
+_WORD_WEIGHT = 1.0
+_TRIGRAM_WEIGHT = 0.5
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word: str) -> Tuple[Tuple[int, ...], Tuple[float, ...]]:
+    """Hash a word and the character trigrams of the padded word; words repeat, so this is cached."""
+    padded = f"#{word}#"
+    features = [f"w:{word}"] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    hashes = tuple(zlib.crc32(feature.encode("utf-8")) for feature in features)
+    weights = (_WORD_WEIGHT,) + (_TRIGRAM_WEIGHT,) * (len(features) - 1)
+    return hashes, weights
+
+
+def fallback_embed_batch(texts: List[str], dim: int = FALLBACK_DIM) -> np.ndarray:
+    """
+    Embed texts with signed feature hashing of words and character trigrams.
+
+    The result is deterministic across processes (CRC32, not Python's salted
+    hash), so rankings stay stable and vectors can be cached. All rows are
+    accumulated with a single bincount.
+
+    Args:
+        texts: The texts to embed
+        dim: Output dimension, matching the model's embedding size
+
+    Returns:
+        L2-normalized float32 matrix with one row per text
+    """
+    rows, hashes, weights = [], [], []
+    for row, text in enumerate(texts):
+        for word in _WORD.findall(text.casefold()):
+            word_hashes, word_weights = _word_features(word)
+            rows.extend([row] * len(word_hashes))
+            hashes.extend(word_hashes)
+            weights.extend(word_weights)
+
+    matrix = np.zeros(len(texts) * dim, dtype=np.float64)
+    if hashes:
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        # The low bit picks the sign so colliding features tend to cancel rather than pile up
+        signs = np.where(hashes & 1, 1.0, -1.0)
+        buckets = (hashes >> 1) % dim
+        flat = np.asarray(rows, dtype=np.int64) * dim + buckets
+        matrix = np.bincount(flat, weights=signs * np.asarray(weights), minlength=len(texts) * dim)
+
+    matrix = matrix.reshape(len(texts), dim).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def fallback_embed(text: str, dim: int = FALLBACK_DIM) -> np.ndarray:
+    """Embed a single text with the fallback hashing embedder."""
+    return fallback_embed_batch([text], dim)[0]
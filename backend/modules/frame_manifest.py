@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+MANIFEST_NAME = "manifest.json"
+
+def prompt_hash(prompt):
+    """Stable hash of a prompt, recorded per frame so changed prompts are re-rendered"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+def file_sha256(path):
+    """Hash a finished frame so a rerun can verify it was not truncated or replaced"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class FrameManifest:
+    """
+    Job manifest stored next to the rendered frames.
+
+    Records the prompt hash, model, steps and status of every frame so that a
+    rerun can skip frames that already completed and retry only the rest.
+    Every update is written atomically, so a crash mid-run leaves a valid file.
+    """
+
+    def __init__(self, output_dir, prompts_file=None):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.data = {"prompts_file": prompts_file, "created": datetime.now().isoformat(), "frames": {}}
+
+    @classmethod
+    def load(cls, output_dir, prompts_file=None):
+        """Load the manifest in output_dir, or start an empty one"""
+        manifest = cls(output_dir, prompts_file)
+        if os.path.exists(manifest.path):
+            try:
+                with open(manifest.path, "r") as f:
+                    manifest.data = json.load(f)
+                manifest.data.setdefault("frames", {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring unreadable manifest {manifest.path}: {e}")
+        if prompts_file:
+            manifest.data["prompts_file"] = prompts_file
+        return manifest
+
+    @property
+    def prompts_file(self):
+        return self.data.get("prompts_file")
+
+    def frame(self, number):
+        return self.data["frames"].get(str(number))
+
+    def is_complete(self, number, prompt, model, steps, output_path):
+        """True if the frame was rendered with the same prompt, model and steps and the file is intact"""
+        entry = self.frame(number)
+        if not entry or entry.get("status") != "done":
+            return False
+        if entry.get("prompt_hash") != prompt_hash(prompt) or entry.get("model") != model or entry.get("steps") != steps:
+            return False
+        if not os.path.exists(output_path) or os.path.getsize(output_path) != entry.get("bytes"):
+            return False
+        return file_sha256(output_path) == entry.get("sha256")
+
+    def update(self, number, prompt, model, steps, status, output_path=None, error=None, save=True):
+        """Record a frame's status and persist the manifest (unless save=False, see save())"""
+        with self.lock:
+            previous = self.data["frames"].get(str(number), {})
+            entry = {
+                "file": os.path.basename(output_path) if output_path else previous.get("file"),
+                "prompt_hash": prompt_hash(prompt),
+                "model": model,
+                "steps": steps,
+                "status": status,
+                "attempts": previous.get("attempts", 0) + (1 if status in ("done", "failed") else 0),
+                "updated": datetime.now().isoformat()
+            }
+            if status == "done" and output_path:
+                entry["bytes"] = os.path.getsize(output_path)
+                entry["sha256"] = file_sha256(output_path)
+            if error:
+                entry["error"] = str(error)
+            self.data["frames"][str(number)] = entry
+            if save:
+                self._save()
+
+    def save(self):
+        """Persist the manifest after a series of updates made with save=False"""
+        with self.lock:
+            self._save()
+
+    def summary(self):
+        """Count frames by status"""
+        counts = {}
+        for entry in self.data["frames"].values():
+            counts[entry.get("status")] = counts.get(entry.get("status"), 0) + 1
+        return counts
+
+    def _save(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
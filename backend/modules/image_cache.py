@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "images"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Set IMAGE_CACHE=off to always call the API
+IMAGE_CACHE_ENABLED = os.environ.get("IMAGE_CACHE", "on").lower() != "off"
+
+# Linux ioctl that clones file extents (reflink) on copy-on-write filesystems such as btrfs and XFS
+_FICLONE = 0x40049409
+
+def image_key(prompt, model, steps):
+    """Content address of a render: the same prompt, model and steps always give the same key"""
+    payload = json.dumps({"prompt": prompt, "model": model, "steps": steps}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _reflink(src, dst):
+    """Clone src into dst without copying data; raises OSError where unsupported"""
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+
+def link_or_copy(src, dst):
+    """Place src at dst as a hard link, a reflink, or (as a last resort) a copy; dst is replaced atomically"""
+    tmp = f"{dst}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        try:
+            _reflink(src, tmp)
+        except (OSError, ImportError):
+            shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache of generated images.
+
+    Images are stored once under a hash of (prompt, model, steps) and linked
+    into output directories on a hit. An SQLite index tracks sizes and last
+    access so the least recently used images are evicted once the cache
+    exceeds its size budget.
+    """
+
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS images (key TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    def _object_path(self, key):
+        return os.path.join(self.cache_dir, "objects", key[:2], f"{key}.png")
+
+    def fetch(self, prompt, model, steps, output_path):
+        """Link a cached render into output_path; returns True on a hit"""
+        key = image_key(prompt, model, steps)
+        path = self._object_path(key)
+        with self.lock:
+            row = self.db.execute("SELECT size FROM images WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.exists(path):
+                self.stats["misses"] += 1
+                return False
+            self.db.execute("UPDATE images SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += row[0]
+        link_or_copy(path, output_path)
+        return True
+
+    def store(self, prompt, model, steps, image_path):
+        """Add a freshly generated image to the cache, then evict down to the size budget"""
+        key = image_key(prompt, model, steps)
+        path = self._object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Copy rather than link so later edits to the output file cannot change the cached bytes
+        tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(image_path, tmp)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO images (key, size, last_access) VALUES (?, ?, ?)",
+                (key, size, time.time())
+            )
+            self.db.commit()
+            self._evict()
+
+    def _evict(self):
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM images").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM images ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._object_path(key))
+            except FileNotFoundError:
+                pass
+            self.db.execute("DELETE FROM images WHERE key = ?", (key,))
+            total -= size
+            self.stats["evictions"] += 1
+        self.db.commit()
+
+    def report(self):
+        """Return hit rate, bytes saved and current cache size"""
+        with self.lock:
+            stats = dict(self.stats)
+            count, total = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images").fetchone()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["entries"] = count
+        stats["bytes"] = total
+        return stats
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """Return the shared image cache, or None if IMAGE_CACHE=off"""
+    global _default_cache
+    if not IMAGE_CACHE_ENABLED:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache()
+        return _default_cache
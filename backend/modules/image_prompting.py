@@ -2,14 +2,48 @@ import os
 import json
 import time
 import random
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Optional
 import google.generativeai as genai
 from datetime import datetime
 from dotenv import load_dotenv
 from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+from modules.prompt_store import PROMPT_STORE_DIR, get_prompt_store
 
 load_dotenv()
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash-lite")
+# Keyframe mode: frames between planned keyframes, frames per interpolation call, concurrent calls
+KEYFRAME_INTERVAL = int(os.environ.get("PROMPT_KEYFRAME_INTERVAL", "10"))
+FRAME_BATCH_SIZE = int(os.environ.get("PROMPT_BATCH_SIZE", "10"))
+PROMPT_CONCURRENCY = int(os.environ.get("PROMPT_CONCURRENCY", "4"))
+PROMPT_MODES = ("sequential", "keyframes")
+JSON_RESPONSE = {"response_mime_type": "application/json"}
+
+def parse_json_response(text: str):
+    """Parse a JSON model response, tolerating a surrounding markdown code fence."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text)
+
+def keyframe_layout(num_frames: int, keyframe_interval: int, batch_size: int):
+    """
+    Place keyframes every keyframe_interval frames (always including the last frame)
+    and split the frames between each pair into batches of at most batch_size.
+    
+    Returns:
+        Tuple of (keyframe positions, per-segment lists of (first frame, count)), 0-based
+    """
+    positions = list(range(0, num_frames, max(1, keyframe_interval)))
+    if positions[-1] != num_frames - 1:
+        positions.append(num_frames - 1)
+    segments = []
+    for k in range(len(positions) - 1):
+        start, end = positions[k], positions[k + 1]
+        segments.append([(first, min(batch_size, end - first)) for first in range(start + 1, end, max(1, batch_size))])
+    return positions, segments
 
 class SequentialImagePromptGenerator:
     def __init__(self, api_key: str = GOOGLE_API_KEY):
@@ -19,13 +53,17 @@ class SequentialImagePromptGenerator:
         
         # Configure the Gemini API
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
+        self.model = genai.GenerativeModel(GEMINI_MODEL)
+        self.api_calls = 0
         
-    def _call_api_with_retry(self, content, max_retries=6, base_delay=3.0):
+    def _call_api_with_retry(self, content, max_retries=6, base_delay=3.0, generation_config=None):
         """Call the API with exponential backoff retry logic."""
         retries = 0
         while retries <= max_retries:
             try:
+                self.api_calls += 1
+                if generation_config is not None:
+                    return self.model.generate_content(content, generation_config=generation_config)
                 return self.model.generate_content(content)
             except (ResourceExhausted, ServiceUnavailable) as e:
                 retries += 1
@@ -39,8 +77,9 @@ class SequentialImagePromptGenerator:
             except Exception as e:
                 raise Exception(f"API Error: {str(e)}")
     
-    def generate_initial_prompt(self, scene_description: str, total_frames: int = 60) -> str:
-        """Generate the first prompt based on a general scene description."""
+    @staticmethod
+    def _initial_prompt_request(scene_description: str, total_frames: int) -> List[str]:
+        """Build the request for the first prompt of a sequence."""
         system_prompt = f"""
         You are an expert at creating detailed image prompts. 
         I need you to create the first image in a sequence of {total_frames} images that will form a cohesive animation or video-like sequence.
@@ -49,12 +88,16 @@ class SequentialImagePromptGenerator:
         """
         
         prompt = f"Create an initial image prompt for the following scene: {scene_description}"
-        
-        response = self._call_api_with_retry([system_prompt, prompt])
+        return [system_prompt, prompt]
+    
+    def generate_initial_prompt(self, scene_description: str, total_frames: int = 60) -> str:
+        """Generate the first prompt based on a general scene description."""
+        response = self._call_api_with_retry(self._initial_prompt_request(scene_description, total_frames))
         return response.text.strip()
     
-    def generate_next_prompt(self, previous_prompt: str, frame_number: int, total_frames: int = 60) -> str:
-        """Generate the next prompt in the sequence based on the previous one."""
+    @staticmethod
+    def _next_prompt_request(previous_prompt: str, frame_number: int, total_frames: int) -> str:
+        """Build the request for the frame after previous_prompt."""
         system_prompt = f"""
         You are an expert at creating sequential image prompts.
         I'm creating a series of {total_frames} images that will appear as a fluid video when viewed in sequence.
@@ -69,40 +112,186 @@ class SequentialImagePromptGenerator:
         
         Respond with ONLY the image prompt text, nothing else.
         """
-        
-        response = self._call_api_with_retry(system_prompt)
+        return system_prompt
+    
+    def generate_next_prompt(self, previous_prompt: str, frame_number: int, total_frames: int = 60) -> str:
+        """Generate the next prompt in the sequence based on the previous one."""
+        response = self._call_api_with_retry(self._next_prompt_request(previous_prompt, frame_number, total_frames))
         return response.text.strip()
     
-    def generate_prompt_sequence(self, initial_scene: str, num_frames: int = 60) -> List[str]:
-        """Generate a sequence of prompts that evolve like frames in a video."""
-        prompts = []
+    def iter_prompt_sequence(self, initial_scene: str, num_frames: int = 60,
+                             start_prompts: Optional[List[str]] = None) -> Iterator[str]:
+        """
+        Yield the prompts of a sequence one at a time, as soon as each is generated.
         
-        # Generate initial prompt
-        print(f"Generating initial frame...")
-        current_prompt = self.generate_initial_prompt(initial_scene)
-        prompts.append(current_prompt)
+        If start_prompts is given (e.g. a shorter stored sequence of the same scene),
+        they are yielded first and the sequence continues from the last of them.
+        """
+        if start_prompts:
+            yield from start_prompts
+            current_prompt = start_prompts[-1]
+            generated = len(start_prompts)
+        else:
+            # Generate initial prompt
+            print(f"Generating initial frame...")
+            current_prompt = self.generate_initial_prompt(initial_scene)
+            yield current_prompt
+            generated = 1
         
         # Generate subsequent prompts
-        for i in range(2, num_frames + 1):
+        for i in range(generated + 1, num_frames + 1):
             # Add a small delay between requests to avoid rate limiting
             time.sleep(0.5)
             
             try:
                 current_prompt = self.generate_next_prompt(current_prompt, i, num_frames)
-                prompts.append(current_prompt)
-                print(f"Generated frame {i}/{num_frames}")
             except Exception as e:
                 print(f"\nError generating frame {i}: {str(e)}")
-                print(f"Stopping sequence generation. {len(prompts)} frames were successfully generated.")
+                print(f"Stopping sequence generation. {generated} frames were successfully generated.")
                 break
+            print(f"Generated frame {i}/{num_frames}")
+            yield current_prompt
+            generated += 1
+    
+    def generate_prompt_sequence(self, initial_scene: str, num_frames: int = 60) -> List[str]:
+        """Generate a sequence of prompts that evolve like frames in a video."""
+        return list(self.iter_prompt_sequence(initial_scene, num_frames))
+    
+    @staticmethod
+    def _keyframe_plan_request(scene_description: str, num_keyframes: int, total_frames: int) -> List[str]:
+        """Build the request that plans the keyframes and shared style of a sequence."""
+        system_prompt = f"""
+        You are an expert at planning image sequences for animation.
+        I'm creating a series of {total_frames} images that will appear as a fluid video when viewed in sequence.
+        Plan {num_keyframes} evenly spaced keyframes that tell the scene from start to finish.
         
-        return prompts
+        Respond with JSON only, in this form:
+        {{"style": "<characters, setting, lighting and art style shared by every frame>",
+          "keyframes": ["<detailed image prompt for keyframe 1>", ..., "<keyframe {num_keyframes}>"]}}
+        
+        Every keyframe prompt must be a complete, standalone image prompt that repeats the shared style,
+        and consecutive keyframes should differ only by a small, natural progression of the action.
+        """
+        
+        prompt = f"Plan the keyframes for the following scene: {scene_description}"
+        return [system_prompt, prompt]
+    
+    @staticmethod
+    def _parse_keyframe_plan(text: str, num_keyframes: int) -> Dict:
+        plan = parse_json_response(text)
+        keyframes = plan.get("keyframes") if isinstance(plan, dict) else None
+        if not isinstance(keyframes, list) or len(keyframes) != num_keyframes:
+            raise ValueError(f"Expected {num_keyframes} keyframes, got {len(keyframes) if isinstance(keyframes, list) else 'none'}")
+        return {"style": plan.get("style", ""), "keyframes": [str(k).strip() for k in keyframes]}
+    
+    def plan_keyframes(self, scene_description: str, num_keyframes: int, total_frames: int) -> Dict:
+        """Plan the whole sequence in one call: a shared style guide plus evenly spaced keyframe prompts."""
+        response = self._call_api_with_retry(self._keyframe_plan_request(scene_description, num_keyframes, total_frames),
+                                             generation_config=JSON_RESPONSE)
+        return self._parse_keyframe_plan(response.text, num_keyframes)
+    
+    @staticmethod
+    def _frame_batch_request(style: str, start_prompt: str, end_prompt: str, start_frame: int,
+                             end_frame: int, first: int, count: int, total_frames: int) -> str:
+        """Build the request for `count` in-between frames, starting at frame `first`, between two keyframes."""
+        system_prompt = f"""
+        You are an expert at creating sequential image prompts.
+        I'm creating a series of {total_frames} images that will appear as a fluid video when viewed in sequence.
+        Shared style for every frame: "{style}"
+        
+        Frame {start_frame} is described as: "{start_prompt}"
+        Frame {end_frame} is described as: "{end_prompt}"
+        
+        Write the prompts for frames {first} to {first + count - 1}, which lie between these two frames.
+        Each frame should show a subtle but clear progression towards frame {end_frame}, proportional to its position.
+        Maintain visual consistency (same characters, setting, style) while showing movement or change.
+        Motion should be smooth and incremental as if this were a frame in an animation. Do not change the scene abruptly.
+        
+        Respond with JSON only: a list of exactly {count} complete image prompt strings, in frame order.
+        """
+        return system_prompt
+    
+    @staticmethod
+    def _parse_frame_batch(text: str, count: int) -> List[str]:
+        frames = parse_json_response(text)
+        if isinstance(frames, dict):
+            frames = frames.get("frames") or frames.get("prompts")
+        if not isinstance(frames, list) or len(frames) != count:
+            raise ValueError(f"Expected {count} frames, got {len(frames) if isinstance(frames, list) else 'none'}")
+        return [str(frame).strip() for frame in frames]
+    
+    def generate_frame_batch(self, style: str, start_prompt: str, end_prompt: str, start_frame: int,
+                             end_frame: int, first: int, count: int, total_frames: int) -> List[str]:
+        """Generate `count` in-between frames (starting at frame `first`) between two keyframes in one call."""
+        request = self._frame_batch_request(style, start_prompt, end_prompt, start_frame, end_frame, first, count, total_frames)
+        response = self._call_api_with_retry(request, generation_config=JSON_RESPONSE)
+        return self._parse_frame_batch(response.text, count)
+    
+    def iter_keyframe_sequence(self, initial_scene: str, num_frames: int = 60,
+                               keyframe_interval: int = KEYFRAME_INTERVAL, batch_size: int = FRAME_BATCH_SIZE,
+                               max_workers: int = PROMPT_CONCURRENCY) -> Iterator[str]:
+        """
+        Yield a prompt sequence planned from keyframes, in frame order.
+        
+        One call plans evenly spaced keyframes and a shared style guide. The frames
+        between each pair of keyframes only depend on those two keyframes, so the
+        segments are requested concurrently, each batch of up to `batch_size`
+        frames in a single call. 100 frames take about 11 calls instead of 100
+        strictly sequential ones. A batch that fails or comes back malformed is
+        regenerated frame by frame from the previous frame.
+        """
+        if num_frames < 1:
+            return
+        positions, segments = keyframe_layout(num_frames, keyframe_interval, batch_size)
+        
+        print(f"Planning {len(positions)} keyframes for {num_frames} frames...")
+        plan = self.plan_keyframes(initial_scene, len(positions), num_frames)
+        style, keyframes = plan["style"], plan["keyframes"]
+        
+        def interpolate(k, first, count):
+            start, end = positions[k], positions[k + 1]
+            try:
+                return self.generate_frame_batch(style, keyframes[k], keyframes[k + 1], start + 1, end + 1,
+                                                 first + 1, count, num_frames)
+            except Exception as e:
+                print(f"Batch for frames {first + 1}-{first + count} failed ({e}); generating them one by one.")
+                frames, previous = [], keyframes[k]
+                for i in range(first, first + count):
+                    previous = self.generate_next_prompt(previous, i + 1, num_frames)
+                    frames.append(previous)
+                return frames
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [[executor.submit(interpolate, k, first, count) for first, count in jobs]
+                       for k, jobs in enumerate(segments)]
+            try:
+                yield keyframes[0]
+                for k, segment in enumerate(futures):
+                    for future in segment:
+                        try:
+                            frames = future.result()
+                        except Exception as e:
+                            print(f"\nError generating frames after frame {positions[k] + 1}: {str(e)}")
+                            print(f"Stopping sequence generation.")
+                            return
+                        yield from frames
+                    yield keyframes[k + 1]
+                    print(f"Generated frame {positions[k + 1] + 1}/{num_frames}")
+            finally:
+                for segment in futures:
+                    for future in segment:
+                        future.cancel()
+    
+    def generate_keyframe_sequence(self, initial_scene: str, num_frames: int = 60, **kwargs) -> List[str]:
+        """Generate a sequence of prompts from planned keyframes (see iter_keyframe_sequence)."""
+        return list(self.iter_keyframe_sequence(initial_scene, num_frames, **kwargs))
     
     def save_prompts(self, prompts: List[str], output_path: str = None) -> str:
         """Save the generated prompts to a JSON file."""
         if output_path is None:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"/Users/jeevanbhatta/SkillMitra/generated_prompts_{timestamp}.json"
+            os.makedirs(PROMPT_STORE_DIR, exist_ok=True)
+            output_path = os.path.join(PROMPT_STORE_DIR, f"generated_prompts_{timestamp}.json")
         
         data = {
             "timestamp": datetime.now().isoformat(),
@@ -115,7 +304,40 @@ class SequentialImagePromptGenerator:
         
         return output_path
 
-def generate_video_prompts(scene_description: str, num_frames: int = 60, api_key: str = GOOGLE_API_KEY) -> List[str]:
+def open_prompt_sequence(scene_description: str, num_frames: int = 60, api_key: str = GOOGLE_API_KEY,
+                         mode: str = "sequential", store=None):
+    """
+    Return the prompts for a scene, reusing the prompt store where possible.
+    
+    An identical earlier request (same normalized scene, frame count, model and mode)
+    is served from the store without calling the API. In sequential mode a shorter
+    stored sequence of the same scene is extended from its last frame. Otherwise a
+    new sequence is generated. New prompts are yielded lazily, so callers can start
+    using them before the sequence is finished.
+    
+    Returns:
+        Tuple of (iterable of prompts, source), source being "stored", "extended" or "generated"
+    """
+    if mode not in PROMPT_MODES:
+        raise ValueError(f"Unknown prompt mode '{mode}'. Choose one of: {', '.join(PROMPT_MODES)}")
+    if store is not None:
+        found = store.get(scene_description, num_frames, GEMINI_MODEL, mode)
+        if found is not None:
+            print(f"Reusing {num_frames} stored prompts from {found[0]}")
+            return found[1], "stored"
+    
+    generator = SequentialImagePromptGenerator(api_key)
+    if store is not None and mode == "sequential":
+        stored = store.find_extendable(scene_description, num_frames, GEMINI_MODEL, mode)
+        if stored:
+            print(f"Extending a stored sequence of {len(stored)} prompts to {num_frames}")
+            return generator.iter_prompt_sequence(scene_description, num_frames, start_prompts=stored), "extended"
+    if mode == "keyframes":
+        return generator.iter_keyframe_sequence(scene_description, num_frames), "generated"
+    return generator.iter_prompt_sequence(scene_description, num_frames), "generated"
+
+def generate_video_prompts(scene_description: str, num_frames: int = 60, api_key: str = GOOGLE_API_KEY,
+                           mode: str = "sequential", use_store: bool = True) -> List[str]:
     """
     Convenience function to generate a sequence of image prompts for video-like effect.
     
@@ -123,18 +345,24 @@ def generate_video_prompts(scene_description: str, num_frames: int = 60, api_key
         scene_description: A description of the scene you want to create
         num_frames: Number of sequential frames to generate (default: 60)
         api_key: Google API key for Gemini (optional if set as environment variable)
+        mode: "sequential" (one call per frame, each from the previous one) or
+              "keyframes" (plan keyframes, then interpolate segments concurrently in batches)
+        use_store: Reuse or extend sequences from the prompt store and save new ones to it
     
     Returns:
         List of image prompts
     """
+    if mode not in PROMPT_MODES:
+        raise ValueError(f"Unknown prompt mode '{mode}'. Choose one of: {', '.join(PROMPT_MODES)}")
     try:
-        generator = SequentialImagePromptGenerator(api_key)
-        prompts = generator.generate_prompt_sequence(scene_description, num_frames)
+        store = get_prompt_store() if use_store else None
+        sequence, source = open_prompt_sequence(scene_description, num_frames, api_key, mode, store)
+        prompts = list(sequence)
         
-        if prompts:
-            # Save the prompts
-            output_path = generator.save_prompts(prompts)
-            print(f"Prompts saved to {output_path}")
+        if prompts and store is not None and source != "stored":
+            output_path = store.put(scene_description, prompts, GEMINI_MODEL, mode, num_frames)
+            if output_path:
+                print(f"Prompts saved to {output_path}")
         
         return prompts
     except Exception as e:
@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from modules.metrics import register_provider
+
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "jobs.sqlite"))
+# Renders that run at once in each server process; the rest wait in the queue
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# Jobs a process accepts (running + queued) before submissions are refused
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "32"))
+# Finished jobs are forgotten after this many seconds (default: 7 days)
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a task when its job has been cancelled"""
+
+class QueueFull(Exception):
+    """Raised by submit when the process already holds JOB_MAX_PENDING jobs"""
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+class Job:
+    """Handle passed to a running task for reporting progress and noticing cancellation"""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.id = job_id
+        self.cancel_event = threading.Event()
+
+    def cancelled(self):
+        return self.cancel_event.is_set() or self.queue._cancel_requested(self.id)
+
+    def update(self, progress, message=None):
+        """Record progress (0.0-1.0); raises JobCancelled if the job was cancelled meanwhile"""
+        if self.cancelled():
+            raise JobCancelled(self.id)
+        self.queue._update(self.id, progress=round(min(max(progress, 0.0), 1.0), 4), message=message)
+
+class JobQueue:
+    """
+    Background jobs on a bounded thread pool, with their state in SQLite.
+
+    Tasks run on JOB_WORKERS threads, so long renders never occupy the web
+    server's request threads. Every state change is written to the jobs table,
+    which all server processes share: any worker can answer a status request or
+    record a cancellation, and the process running the job picks the
+    cancellation up at the task's next progress update. Jobs left queued or
+    running by a process that has exited are marked failed.
+    """
+
+    def __init__(self, db_path=JOB_DB_PATH, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING):
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+        self.lock = threading.Lock()
+        self.active = {}
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+                " progress REAL NOT NULL DEFAULT 0, message TEXT, params TEXT, result TEXT, error TEXT,"
+                " cancel_requested INTEGER NOT NULL DEFAULT 0, owner_pid INTEGER,"
+                " created REAL NOT NULL, started REAL, finished REAL)"
+            )
+            self.db.commit()
+        self._recover()
+
+    def _recover(self):
+        """Fail jobs whose owning process is gone, and drop finished jobs past the retention period"""
+        now = time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, owner_pid FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            for row in rows:
+                if row["owner_pid"] != os.getpid() and not _pid_alive(row["owner_pid"]):
+                    self.db.execute(
+                        "UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                        (FAILED, "Interrupted by a server restart", now, row["id"])
+                    )
+            self.db.execute(
+                f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED_STATES))}) AND finished < ?",
+                (*FINISHED_STATES, now - JOB_RETENTION_SECONDS)
+            )
+            self.db.commit()
+
+    def submit(self, kind, task, params):
+        """
+        Queue task(job, **params) and return the new job's ID.
+        `params` must be JSON-serializable; it is stored with the job.
+        """
+        with self.lock:
+            if len(self.active) >= self.max_pending:
+                raise QueueFull(f"{len(self.active)} jobs are already queued or running")
+            job_id = uuid.uuid4().hex
+            self.db.execute(
+                "INSERT INTO jobs (id, kind, status, params, owner_pid, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), os.getpid(), time.time())
+            )
+            self.db.commit()
+            job = Job(self, job_id)
+            self.active[job_id] = (job, self.executor.submit(self._run, job, task, params))
+        return job_id
+
+    def _run(self, job, task, params):
+        try:
+            if job.cancelled():
+                raise JobCancelled(job.id)
+            self._update(job.id, status=RUNNING, started=time.time())
+            result = task(job, **params)
+            self._update(job.id, status=SUCCEEDED, progress=1.0, result=json.dumps(result), finished=time.time())
+        except JobCancelled:
+            self._update(job.id, status=CANCELLED, finished=time.time())
+        except Exception as e:
+            print(f"Job {job.id} failed: {e}")
+            self._update(job.id, status=FAILED, error=str(e), finished=time.time())
+        finally:
+            with self.lock:
+                self.active.pop(job.id, None)
+
+    def _update(self, job_id, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock:
+            self.db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self.db.commit()
+
+    def _cancel_requested(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def get(self, job_id):
+        """Return the job's state as a dict, or None for an unknown ID"""
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"]) if job["params"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        del job["owner_pid"]
+        return job
+
+    def cancel(self, job_id):
+        """
+        Request cancellation. A queued job is cancelled at once; a running job
+        stops at its next progress update. Returns the job's state, or None.
+        """
+        with self.lock:
+            self.db.execute(
+                f"UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status NOT IN ({','.join('?' * len(FINISHED_STATES))})",
+                (job_id, *FINISHED_STATES)
+            )
+            self.db.commit()
+            job, future = self.active.get(job_id, (None, None))
+        if job is not None:
+            job.cancel_event.set()
+            if future.cancel():
+                self._update(job_id, status=CANCELLED, finished=time.time())
+                with self.lock:
+                    self.active.pop(job_id, None)
+        return self.get(job_id)
+
+    def report(self):
+        """Job counts by state across all processes, plus this process's pool usage"""
+        with self.lock:
+            counts = dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            active = len(self.active)
+        return {"jobs": counts, "process_active": active, "max_pending": self.max_pending}
+
+_default_queue = None
+_default_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    Return this process's job queue, created on first use so that each
+    pre-forked server worker gets its own thread pool and database connection
+    """
+    global _default_queue
+    with _default_queue_lock:
+        if _default_queue is None:
+            _default_queue = JobQueue()
+            register_provider("jobs", _default_queue.report)
+        return _default_queue
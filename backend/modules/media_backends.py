@@ -0,0 +1,92 @@
+import os
+import uuid
+import threading
+from modules.audio_generation import generate_audio
+from modules.image_generation import generate_image
+
+# Backend used by the media routes and story renders (see MEDIA_BACKENDS)
+MEDIA_BACKEND = os.environ.get("MEDIA_BACKEND", "placeholder")
+# Audio and image generations in flight at once for one story; a 20-image story fans out fully at the default
+MEDIA_CONCURRENCY = int(os.environ.get("MEDIA_CONCURRENCY", "24"))
+# Extra attempts for a failed audio or image generation before it counts as failed
+MEDIA_ITEM_RETRIES = int(os.environ.get("MEDIA_ITEM_RETRIES", "1"))
+# Settings of the "together" backend
+MEDIA_IMAGE_MODEL = os.environ.get("MEDIA_IMAGE_MODEL", "black-forest-labs/FLUX.1-schnell-Free")
+MEDIA_IMAGE_STEPS = int(os.environ.get("MEDIA_IMAGE_STEPS", "4"))
+MEDIA_IMAGE_RPS = float(os.environ.get("MEDIA_IMAGE_RPS", "2.0"))
+
+class MediaBackend:
+    """
+    Interface of a media generator. Both methods take one prompt and return the
+    path of the generated file; they are called concurrently from several
+    threads, so implementations must be thread-safe.
+    """
+
+    # Extra attempts story rendering makes for a failed image; None means MEDIA_ITEM_RETRIES.
+    # Backends that already retry inside generate_image set 0 so calls are not multiplied.
+    image_retries = None
+
+    def generate_audio(self, prompt):
+        raise NotImplementedError
+
+    def generate_image(self, prompt):
+        raise NotImplementedError
+
+class PlaceholderBackend(MediaBackend):
+    """The placeholder generators in audio_generation.py and image_generation.py"""
+
+    def generate_audio(self, prompt):
+        return generate_audio(prompt)
+
+    def generate_image(self, prompt):
+        return generate_image(prompt)
+
+class TogetherBackend(PlaceholderBackend):
+    """
+    Images from the Together API, sharing the process-wide rate limiter and image
+    cache with the animation tools; audio still comes from the placeholder.
+    generate_image_with_retry already backs off and retries rate-limited calls.
+    """
+
+    image_retries = 0
+
+    def __init__(self, model=MEDIA_IMAGE_MODEL, steps=MEDIA_IMAGE_STEPS, requests_per_second=MEDIA_IMAGE_RPS):
+        from modules.together_image_generator import create_client, get_rate_limiter
+        from modules.image_cache import get_image_cache
+        self.model = model
+        self.steps = steps
+        self.client = create_client()
+        self.rate_limiter = get_rate_limiter(requests_per_second)
+        self.cache = get_image_cache()
+
+    def generate_image(self, prompt):
+        from modules.together_image_generator import generate_image_with_retry
+        image_path = f"outputs/image_{uuid.uuid4()}.png"
+        return generate_image_with_retry(
+            self.client, prompt, self.model, image_path, self.steps, rate_limiter=self.rate_limiter, cache=self.cache
+        )
+
+MEDIA_BACKENDS = {
+    "placeholder": PlaceholderBackend,
+    "together": TogetherBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def register_backend(name, backend_class):
+    """Make a MediaBackend subclass available under `name` (e.g. for MEDIA_BACKEND)"""
+    with _backends_lock:
+        MEDIA_BACKENDS[name] = backend_class
+        _backends.pop(name, None)
+
+def get_media_backend(name=None):
+    """Return the shared instance of a named backend (default: MEDIA_BACKEND)"""
+    name = name or MEDIA_BACKEND
+    if name not in MEDIA_BACKENDS:
+        raise ValueError(f"Unknown media backend '{name}'. Choose one of: {', '.join(MEDIA_BACKENDS)}")
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = _backends[name] = MEDIA_BACKENDS[name]()
+        return backend
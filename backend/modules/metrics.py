@@ -0,0 +1,33 @@
+import threading
+from typing import Any, Callable, Dict
+
+# Process-wide counters and snapshot providers, exposed by the /metrics endpoint
+_counters: Dict[str, int] = {}
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+_lock = threading.Lock()
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """Increase a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def register_provider(name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+    """Register a callable that returns a JSON-serializable snapshot under ``name``."""
+    with _lock:
+        _providers[name] = provider
+
+
+def collect() -> Dict[str, Any]:
+    """Return all counters and provider snapshots."""
+    with _lock:
+        counters = dict(_counters)
+        providers = dict(_providers)
+    snapshot: Dict[str, Any] = {"counters": counters}
+    for name, provider in providers.items():
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            snapshot[name] = {"error": str(e)}
+    return snapshot
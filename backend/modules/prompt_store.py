@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+PROMPT_STORE_DIR = os.environ.get("PROMPT_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "prompts"))
+INDEX_NAME = "index.json"
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_scene(scene_description):
+    """Canonical form of a scene description: case, spacing and trailing punctuation do not matter"""
+    return _WHITESPACE.sub(" ", scene_description).strip().rstrip(".!").strip().casefold()
+
+def sequence_key(scene_description, num_frames, model, mode="sequential", partial=False):
+    """Key of a stored sequence: normalized scene, frame count, prompt model, generation mode and whether it is partial"""
+    fields = {"scene": normalize_scene(scene_description), "frames": num_frames, "model": model, "mode": mode}
+    if partial:
+        fields["partial"] = True
+    payload = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+class PromptStore:
+    """
+    Keyed store of generated prompt sequences.
+
+    Each sequence is saved as its own JSON file (same format as
+    SequentialImagePromptGenerator.save_prompts) and listed in index.json, so
+    lookups read one small index instead of scanning the directory. A request
+    for the same scene, frame count and model reuses the stored sequence; a
+    request for more frames can extend the longest stored one from its last frame.
+    A sequential run cut short (by an error or timeout) is kept as a partial
+    sequence, which is only ever extended, never served as a complete one.
+    """
+
+    def __init__(self, directory=PROMPT_STORE_DIR):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_NAME)
+        self.lock = threading.Lock()
+        self.index = {}
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r") as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: ignoring unreadable prompt index {self.index_path}: {e}")
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key):
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        try:
+            with open(self.path(key), "r") as f:
+                prompts = json.load(f).get("prompts", [])
+        except (OSError, ValueError):
+            return None
+        return prompts if len(prompts) == entry["frames"] else None
+
+    def get(self, scene_description, num_frames, model, mode="sequential"):
+        """Return (path, prompts) of a stored sequence with exactly this key, or None"""
+        key = sequence_key(scene_description, num_frames, model, mode)
+        with self.lock:
+            prompts = self._load(key)
+            if prompts is None:
+                return None
+            self.index[key]["last_used"] = datetime.now().isoformat()
+            self._save_index()
+        return self.path(key), prompts
+
+    def find_extendable(self, scene_description, num_frames, model, mode="sequential"):
+        """Return the prompts of the longest stored sequence for this scene, model and mode that is shorter than num_frames"""
+        scene = normalize_scene(scene_description)
+        with self.lock:
+            candidates = sorted(
+                (entry["frames"], key) for key, entry in self.index.items()
+                if entry["scene"] == scene and entry["model"] == model and entry["mode"] == mode
+                and entry["frames"] < num_frames
+            )
+            for _, key in reversed(candidates):
+                prompts = self._load(key)
+                if prompts:
+                    return prompts
+        return None
+
+    def put(self, scene_description, prompts, model, mode="sequential", num_frames=None):
+        """
+        Store a sequence under its scene, length, model and mode; returns the file path.
+
+        num_frames is the length that was requested. A shorter sequence is stored as
+        partial (extension only) in sequential mode, and not stored at all in other
+        modes, whose prefixes cannot be extended; None is returned then.
+        """
+        partial = num_frames is not None and len(prompts) < num_frames
+        if partial and mode != "sequential":
+            return None
+        key = sequence_key(scene_description, len(prompts), model, mode, partial)
+        data = {
+            "timestamp": datetime.now().isoformat(),
+            "frame_count": len(prompts),
+            "scene": scene_description,
+            "model": model,
+            "mode": mode,
+            "partial": partial,
+            "prompts": list(prompts)
+        }
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_json(self.path(key), data)
+            self.index[key] = {
+                "scene": normalize_scene(scene_description),
+                "frames": len(prompts),
+                "model": model,
+                "mode": mode,
+                "partial": partial,
+                "created": data["timestamp"],
+                "last_used": data["timestamp"]
+            }
+            self._save_index()
+        return self.path(key)
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_json(self.index_path, self.index)
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+def get_prompt_store():
+    """Return the shared prompt store in PROMPT_STORE_DIR"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PromptStore()
+        return _default_store
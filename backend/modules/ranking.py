@@ -0,0 +1,137 @@
+import numpy as np
+from typing import Any, Dict, List
+
+# Difficulty and experience levels are mapped to small integer codes so the
+# bonus can be looked up for every course at once
+DIFFICULTY_CODES = {"beginner": 0, "intermediate": 1, "advanced": 2}
+UNKNOWN_DIFFICULTY = len(DIFFICULTY_CODES)
+
+EXPERIENCE_CODES = {"no experience": 0, "beginner": 1, "intermediate": 2, "advanced": 3}
+UNKNOWN_EXPERIENCE = len(EXPERIENCE_CODES)
+
+DIFFICULTY_BONUS = 0.1
+
+# Rows are experience codes, columns are difficulty codes
+_BONUS_TABLE = np.zeros((UNKNOWN_EXPERIENCE + 1, UNKNOWN_DIFFICULTY + 1), dtype=np.float32)
+_BONUS_TABLE[0, [0]] = DIFFICULTY_BONUS       # No experience -> beginner
+_BONUS_TABLE[1, [0, 1]] = DIFFICULTY_BONUS    # Beginner -> beginner, intermediate
+_BONUS_TABLE[2, [1, 2]] = DIFFICULTY_BONUS    # Intermediate -> intermediate, advanced
+_BONUS_TABLE[3, [2]] = DIFFICULTY_BONUS       # Advanced -> advanced
+
+RESULT_FIELDS = ["course_id", "title", "description", "difficulty", "duration", "image_url"]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class CourseRanker:
+    """Columnar view of the course catalog for fast top-k ranking."""
+
+    def __init__(self, courses: List[Dict[str, Any]]):
+        self.courses = courses
+        self.size = len(courses)
+        self.difficulty_codes = np.fromiter(
+            (DIFFICULTY_CODES.get(str(course.get("difficulty", "")).lower(), UNKNOWN_DIFFICULTY) for course in courses),
+            dtype=np.int8,
+            count=self.size
+        )
+        self.columns = {field: [course.get(field, "") for course in courses] for field in RESULT_FIELDS}
+        self.columns["skills_covered"] = [course.get("skills_covered", []) for course in courses]
+
+    def difficulty_bonus(self, experience_level: str) -> np.ndarray:
+        """Return the per-course bonus for a user's experience level."""
+        experience_code = EXPERIENCE_CODES.get((experience_level or "").lower(), UNKNOWN_EXPERIENCE)
+        return _BONUS_TABLE[experience_code][self.difficulty_codes]
+
+    def rank(self, similarities: np.ndarray, experience_level: str, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Apply the difficulty bonus and build result dicts for the top k courses.
+
+        Args:
+            similarities: Cosine similarity of the user to every course
+            experience_level: The user's answer to the experience question
+            k: Number of courses to return
+
+        Returns:
+            List of JSON-serializable course dicts, best match first
+        """
+        scores = np.asarray(similarities, dtype=np.float32) + self.difficulty_bonus(experience_level)
+        winners = top_k(scores, k)
+        return self.build_results(winners, scores[winners])
+
+    def rank_subset(self, indices: np.ndarray, similarities: np.ndarray, experience_level: str, k: int = 3) -> List[Dict[str, Any]]:
+        """
+        Rank only a candidate subset of courses, such as the output of an ANN search.
+
+        Args:
+            indices: Catalog indices of the candidate courses
+            similarities: Cosine similarity of the user to each candidate
+            experience_level: The user's answer to the experience question
+            k: Number of courses to return
+
+        Returns:
+            List of JSON-serializable course dicts, best match first
+        """
+        experience_code = EXPERIENCE_CODES.get((experience_level or "").lower(), UNKNOWN_EXPERIENCE)
+        scores = np.asarray(similarities, dtype=np.float32) + _BONUS_TABLE[experience_code][self.difficulty_codes[indices]]
+        best = top_k(scores, k)
+        return self.build_results(indices[best], scores[best])
+
+    def rank_batch(self, similarities: np.ndarray, experience_levels: List[str], k: int = 3) -> List[List[Dict[str, Any]]]:
+        """
+        Rank courses for many users at once.
+
+        Args:
+            similarities: Matrix of cosine similarities, one row per user and one column per course
+            experience_levels: Each user's answer to the experience question
+            k: Number of courses to return per user
+
+        Returns:
+            One list of JSON-serializable course dicts per user, best match first
+        """
+        experience_codes = np.fromiter(
+            (EXPERIENCE_CODES.get((level or "").lower(), UNKNOWN_EXPERIENCE) for level in experience_levels),
+            dtype=np.intp,
+            count=len(experience_levels)
+        )
+        scores = np.asarray(similarities, dtype=np.float32)
+        scores += _BONUS_TABLE[experience_codes[:, np.newaxis], self.difficulty_codes[np.newaxis, :]]
+
+        k = min(k, self.size)
+        if k <= 0:
+            return [[] for _ in experience_levels]
+        if k < self.size:
+            winners = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            winners = np.tile(np.arange(self.size), (scores.shape[0], 1))
+        winner_scores = np.take_along_axis(scores, winners, axis=1)
+        order = np.argsort(-winner_scores, axis=1, kind="stable")
+        winners = np.take_along_axis(winners, order, axis=1)
+        winner_scores = np.take_along_axis(winner_scores, order, axis=1)
+        return [self.build_results(row, row_scores) for row, row_scores in zip(winners, winner_scores)]
+
+    def build_results(self, indices: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        """Build result dicts only for the selected course indices and their scores."""
+        columns = self.columns
+        return [
+            {
+                "course_id": columns["course_id"][i],
+                "title": columns["title"][i],
+                "description": columns["description"][i],
+                "difficulty": columns["difficulty"][i],
+                "duration": columns["duration"][i],
+                "similarity_score": round(float(score), 3),
+                "image_url": columns["image_url"][i],
+                "skills_covered": columns["skills_covered"][i]
+            }
+            for i, score in zip(indices, scores)
+        ]
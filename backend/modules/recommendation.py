@@ -1,9 +1,20 @@
-import json
 import numpy as np
 import os
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+import time
+import weakref
+import itertools
+from typing import Dict, List, Any, Iterable, Iterator, Optional
 from sentence_transformers import SentenceTransformer
+from modules.catalog import COURSES_PATH
+from modules.course_embeddings import EmbeddingUnavailableError, load_course_embeddings, normalize_rows
+from modules.fallback_embedding import FALLBACK_MODEL_NAME, fallback_embed, fallback_embed_batch
+from modules.ranking import CourseRanker
+from modules.ann_index import IVFIndex, build_index
+from modules.embedding_service import EmbeddingBatcher
+from modules.embedding_cache import EmbeddingCache, cache_key, normalize_text
+from modules.metrics import increment, register_provider
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
@@ -46,47 +57,288 @@ USER_QUESTIONS = [
 
 # Initialize the embedding model - using a smaller model that works well on CPU
 # In production, you might want to use a more powerful model like 'all-mpnet-base-v2'
-_model = "paraphrase-MiniLM-L6-v2"
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL", "paraphrase-MiniLM-L6-v2")
+# Device for inference, e.g. "cpu" or "cuda" (default: let sentence-transformers decide)
+EMBEDDING_DEVICE = os.environ.get("EMBEDDING_DEVICE") or None
+# Number of intra-op threads used by torch (default: torch's own choice)
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+# Coalesce concurrent single-text embeddings into batches (see modules/embedding_service.py)
+EMBEDDING_BATCHING = os.environ.get("EMBEDDING_BATCHING", "on").lower() != "off"
+# Users embedded and scored together by get_recommendations_batch
+RECOMMENDATION_BATCH_SIZE = int(os.environ.get("RECOMMENDATION_BATCH_SIZE", "256"))
+# Upper bound on entries in one (users x courses) score matrix
+MAX_BATCH_SCORES = 32 * 1024 * 1024
+# Seconds to wait before retrying after a failed model load
+MODEL_RETRY_INTERVAL = 60.0
 
-def get_embedding_model():
-    """Lazy loading of the embedding model"""
+# One model instance shared by every worker thread in the process
+_model = None
+_model_lock = threading.Lock()
+_model_status = {"state": "not_loaded", "load_seconds": None, "failed_at": None}
+_first_request_done = False
+_service: Optional[EmbeddingBatcher] = None
+
+# Cache of user-text embeddings, keyed on the normalized text
+_cache = EmbeddingCache()
+register_provider("embedding_cache", _cache.stats)
+
+# Columnar ranker for the currently loaded catalog
+_ranker: Optional[CourseRanker] = None
+# Optional ANN index of each live course matrix, by id(matrix); dropped when the matrix is freed,
+# so requests still holding the previous catalog keep its index while the new one is built
+_indexes: Dict[int, Dict[str, Any]] = {}
+_index_lock = threading.Lock()
+
+def load_embedding_model():
+    """
+    Load the embedding model if it is not loaded yet.
+    
+    Safe to call from several threads; only one of them loads the model.
+    Only the weights are loaded; nothing is encoded, so this is safe to run in
+    a pre-forking server's master before the workers are forked.
+    
+    Returns:
+        The shared SentenceTransformer instance, or None if loading failed
+    """
     global _model
-    if _model is None:
+    if _model is not None:
+        return _model
+    
+    with _model_lock:
+        if _model is not None:
+            return _model
+        
+        _model_status["state"] = "loading"
+        start = time.perf_counter()
         try:
-            logger.info("Loading embedding model...")
-            _model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-            logger.info("Embedding model loaded successfully")
+            logger.info(f"Loading embedding model {EMBEDDING_MODEL_NAME}...")
+            if EMBEDDING_THREADS > 0:
+                import torch
+                torch.set_num_threads(EMBEDDING_THREADS)
+            model = SentenceTransformer(EMBEDDING_MODEL_NAME, device=EMBEDDING_DEVICE)
         except Exception as e:
             logger.error(f"Error loading embedding model: {str(e)}")
-            # Fall back to random embeddings if model fails to load
+            _model_status.update(state="failed", failed_at=time.monotonic())
             return None
-    return _model
+        
+        load_seconds = time.perf_counter() - start
+        _model_status.update(state="ready", load_seconds=round(load_seconds, 3), failed_at=None)
+        logger.info(f"Embedding model loaded in {load_seconds:.2f}s (device={model.device}, threads={EMBEDDING_THREADS or 'default'})")
+        _model = model
+        return _model
 
-def vector_embed(text: str) -> np.ndarray:
+def get_embedding_model():
+    """Return the shared embedding model, loading it on first use if startup preloading was skipped"""
+    if _model is not None:
+        return _model
+    
+    failed_at = _model_status["failed_at"]
+    if failed_at is not None and time.monotonic() - failed_at < MODEL_RETRY_INTERVAL:
+        # Fall back to random embeddings without retrying the load on every call
+        return None
+    return load_embedding_model()
+
+def get_model_status() -> Dict[str, Any]:
+    """Return the model lifecycle state for readiness checks."""
+    return {
+        "model": EMBEDDING_MODEL_NAME,
+        "state": _model_status["state"],
+        "load_seconds": _model_status["load_seconds"],
+        "ready": _model is not None,
+        "degraded": _model is None and _model_status["state"] == "failed"
+    }
+
+register_provider("embedding_model", get_model_status)
+
+def warm_up() -> bool:
+    """
+    Load the embedding model and the course embedding store ahead of the first request.
+    
+    This encodes with the model, so in a pre-forking server call it in each
+    worker after the fork (see gunicorn.conf.py), never in the master: torch
+    thread pools started before a fork do not work in the children.
+    
+    Returns:
+        True if the model is ready to serve requests
+    """
+    start = time.perf_counter()
+    model = load_embedding_model()
+    if model is not None:
+        try:
+            # Run one encode so lazy kernel initialization does not land on the first request
+            model.encode("warm up", show_progress_bar=False)
+        except Exception as e:
+            logger.error(f"Error warming up embedding model: {str(e)}")
+    if model is not None and os.path.exists(COURSES_PATH):
+        try:
+            courses, course_matrix = load_course_embeddings(
+                encode_texts, EMBEDDING_MODEL_NAME, COURSES_PATH, prepare=get_course_index
+            )
+            get_course_ranker(courses)
+        except Exception as e:
+            logger.error(f"Error preloading course embeddings: {str(e)}")
+    logger.info(f"Cold start finished in {time.perf_counter() - start:.2f}s")
+    return model is not None
+
+def embed_with_model(text: str) -> np.ndarray:
     """
     Create vector embedding from text using sentence-transformers.
     
+    Results are cached by a hash of the normalized text, so repeated
+    questionnaire answers skip the model. Cache misses from concurrent
+    callers are coalesced into micro-batches by the embedding service
+    unless EMBEDDING_BATCHING is set to "off".
+    
     Args:
         text: The text to embed
         
     Returns:
         numpy array containing the embedding
+        
+    Raises:
+        EmbeddingUnavailableError: If the model is not loaded or fails to encode
     """
+    key = cache_key(text, EMBEDDING_MODEL_NAME)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    
     model = get_embedding_model()
     if model is None:
-        # Fallback to random embeddings if model couldn't be loaded
-        logger.warning("Using fallback random embeddings")
-        return np.random.rand(384)  # Common embedding size
+        raise EmbeddingUnavailableError("Embedding model is not loaded")
     
     try:
-        return model.encode(text)
+        text = normalize_text(text)
+        service = get_embedding_service(model)
+        embedding = service.embed(text) if service is not None else model.encode(text)
     except Exception as e:
-        logger.error(f"Error generating embedding: {str(e)}")
-        return np.random.rand(384)  # Fallback
+        raise EmbeddingUnavailableError(f"Error generating embedding: {str(e)}") from e
+    _cache.put(key, embedding)
+    return embedding
 
-def get_recommendations(user_responses: Dict[str, str]) -> List[Dict[str, Any]]:
+def vector_embed(text: str) -> np.ndarray:
     """
-    Get course recommendations based on user responses.
+    Create vector embedding from text, falling back to deterministic hashed
+    n-gram features when the model is unavailable.
+    
+    Args:
+        text: The text to embed
+        
+    Returns:
+        numpy array containing the embedding
+    """
+    try:
+        return embed_with_model(text)
+    except EmbeddingUnavailableError as e:
+        logger.warning(f"Using fallback n-gram embeddings: {str(e)}")
+        increment("fallback_embeddings")
+        return fallback_embed(text)
+
+def get_embedding_service(model) -> Optional[EmbeddingBatcher]:
+    """Return the shared micro-batching service for the model, or None when batching is disabled"""
+    global _service
+    if not EMBEDDING_BATCHING:
+        return None
+    if _service is None:
+        with _model_lock:
+            if _service is None:
+                _service = EmbeddingBatcher(
+                    lambda texts: model.encode(texts, batch_size=len(texts), show_progress_bar=False)
+                )
+    return _service
+
+def encode_texts(texts: List[str]) -> Optional[np.ndarray]:
+    """
+    Embed many texts in one batched model call.
+    
+    Args:
+        texts: The texts to embed
+        
+    Returns:
+        2D numpy array with one row per text, or None if the model is unavailable
+    """
+    model = get_embedding_model()
+    if model is None:
+        return None
+    
+    try:
+        return np.asarray(model.encode(texts, batch_size=64, show_progress_bar=False))
+    except Exception as e:
+        logger.error(f"Error generating batch embeddings: {str(e)}")
+        return None
+
+def get_course_ranker(courses: List[Dict[str, Any]]) -> CourseRanker:
+    """Return the columnar ranker for the catalog, rebuilding it when the catalog changes."""
+    global _ranker
+    ranker = _ranker
+    if ranker is None or ranker.courses is not courses:
+        ranker = CourseRanker(courses)
+        _ranker = ranker
+    return ranker
+
+def get_course_index(course_matrix: np.ndarray) -> Optional[IVFIndex]:
+    """
+    Return the ANN index for the course matrix, or None when the exact scan should be used.
+    
+    Indexes are built when a matrix is loaded (see the prepare argument of
+    load_course_embeddings), on the thread that embeds a changed catalog, so
+    requests normally find the index ready.
+    """
+    entry = _indexes.get(id(course_matrix))
+    if entry is None or entry["matrix"]() is not course_matrix:
+        with _index_lock:
+            entry = _indexes.get(id(course_matrix))
+            if entry is None or entry["matrix"]() is not course_matrix:
+                entry = {"matrix": weakref.ref(course_matrix), "index": build_index(course_matrix)}
+                _indexes[id(course_matrix)] = entry
+                weakref.finalize(course_matrix, _indexes.pop, id(course_matrix), None)
+    return entry["index"]
+
+def build_user_text(user_responses: Dict[str, Any]) -> str:
+    """
+    Join a user's answers into one text.
+    
+    Answers are taken in USER_QUESTIONS order, followed by any extra keys, so
+    the same answers always give the same text whatever order the client
+    serialized them in. Multiselect answers may arrive as lists.
+    """
+    question_ids = [question["id"] for question in USER_QUESTIONS]
+    ordered = [qid for qid in question_ids if qid in user_responses]
+    ordered += [key for key in user_responses if key not in question_ids and key != "user_id"]
+    parts = []
+    for question_id in ordered:
+        answer = user_responses[question_id]
+        parts.append(", ".join(answer) if isinstance(answer, list) else str(answer))
+    return " ".join(parts)
+
+def load_scoring_inputs(user_text: str):
+    """
+    Embed the user text and load the matching course matrix.
+    
+    Both sides come from the same embedder: the model when it works, and the
+    deterministic n-gram fallback when it does not.
+    
+    Returns:
+        Tuple of (user_embedding, courses, course_matrix, degraded)
+    """
+    try:
+        user_embedding = embed_with_model(user_text)
+        courses_data, course_matrix = load_course_embeddings(
+            encode_texts, EMBEDDING_MODEL_NAME, COURSES_PATH, prepare=get_course_index
+        )
+        return user_embedding, courses_data, course_matrix, False
+    except EmbeddingUnavailableError as e:
+        logger.warning(f"Recommendations running in degraded mode: {str(e)}")
+        user_embedding = fallback_embed(user_text)
+        courses_data, course_matrix = load_course_embeddings(
+            fallback_embed_batch, FALLBACK_MODEL_NAME, COURSES_PATH, persist=False, prepare=get_course_index
+        )
+        return user_embedding, courses_data, course_matrix, True
+
+def recommend(user_responses: Dict[str, str], k: int = 3) -> Dict[str, Any]:
+    """
+    Get course recommendations based on user responses, along with whether
+    they were produced in degraded (fallback embedding) mode.
     
     Parameters:
     - user_responses: dict containing user answers to questions
@@ -97,82 +349,160 @@ def get_recommendations(user_responses: Dict[str, str]) -> List[Dict[str, Any]]:
         "goals": "I want to start my own home renovation business",
         "time_commitment": "5-10 hours"
       }
+    - k: number of courses to return (default: 3)
       
     Returns:
-    - List of top 3 recommended courses as JSON-serializable objects
+    - Dict with "recommendations" (top k courses as JSON-serializable objects)
+      and "degraded" (True when the embedding model was unavailable)
     """
+    global _first_request_done
+    start = time.perf_counter()
+    degraded = False
     try:
         logger.info("Processing recommendation request")
+        increment("recommendations")
         
         # 1. Combine user responses into a single text for embedding
-        user_text = " ".join(user_responses.values())
+        user_text = build_user_text(user_responses)
         logger.info(f"User text prepared: {user_text[:100]}...")
         
-        user_embedding = vector_embed(user_text)
-        
-        # 2. Load courses from courses.json
-        courses_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "courses.json")
+        # 2. Embed the user and load courses with their precomputed, normalized embeddings
         try:
-            with open(courses_path, "r") as f:
-                courses_data = json.load(f)
+            user_embedding, courses_data, course_matrix, degraded = load_scoring_inputs(user_text)
             logger.info(f"Loaded {len(courses_data)} courses from JSON")
         except Exception as e:
             logger.error(f"Error loading courses data: {str(e)}")
-            return []
-        
-        # 3. Compute similarity using cosine similarity
-        def cosine_similarity(a, b):
-            # Add small epsilon to avoid division by zero
-            epsilon = 1e-8
-            return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + epsilon))
-        
-        # 4. Rank courses based on similarity
-        ranked_courses = []
-        for course in courses_data:
-            # Focus on relevant fields for matching
-            course_text = f"{course.get('title', '')} {course.get('description', '')} " \
-                         f"{' '.join(course.get('skills_covered', []))} " \
-                         f"{course.get('difficulty', '')}"
-            
-            course_embedding = vector_embed(course_text)
-            similarity = cosine_similarity(user_embedding, course_embedding)
-            
-            # Add course difficulty matching - prioritize appropriate difficulty level based on experience
-            difficulty_bonus = 0
-            user_exp = user_responses.get("experience_level", "").lower()
-            course_diff = course.get("difficulty", "").lower()
-            
-            if (user_exp == "no experience" and course_diff == "beginner") or \
-               (user_exp == "beginner" and course_diff in ["beginner", "intermediate"]) or \
-               (user_exp == "intermediate" and course_diff in ["intermediate", "advanced"]) or \
-               (user_exp == "advanced" and course_diff == "advanced"):
-                difficulty_bonus = 0.1  # Boost courses with appropriate difficulty
-            
-            # Adjust similarity score with difficulty bonus
-            adjusted_similarity = similarity + difficulty_bonus
-            
-            # Create a new dict to avoid modifying the original and ensure JSON serializability
-            ranked_course = {
-                "course_id": course.get("course_id", ""),
-                "title": course.get("title", ""),
-                "description": course.get("description", ""),
-                "difficulty": course.get("difficulty", ""),
-                "duration": course.get("duration", ""),
-                "similarity_score": round(adjusted_similarity, 3),
-                "image_url": course.get("image_url", ""),
-                "skills_covered": course.get("skills_covered", [])
-            }
-            ranked_courses.append(ranked_course)
-        
-        # 5. Sort by similarity and return top 3
-        top_recommendations = sorted(ranked_courses, key=lambda x: x["similarity_score"], reverse=True)[:3]
+            return {"recommendations": [], "degraded": degraded}
+        
+        if degraded:
+            increment("recommendations_degraded")
+        user_embedding = np.asarray(user_embedding, dtype=np.float32)
+        user_norm = np.linalg.norm(user_embedding)
+        if user_norm > 0:
+            user_embedding = user_embedding / user_norm
+        
+        # 3. Score courses: probe the ANN index on large catalogs, otherwise one exact matrix-vector product
+        ranker = get_course_ranker(courses_data)
+        experience_level = user_responses.get("experience_level", "")
+        index = get_course_index(course_matrix)
+        
+        # 4. Apply the difficulty bonus and keep the top k courses
+        if index is not None:
+            candidates, similarities = index.search(user_embedding)
+            top_recommendations = ranker.rank_subset(candidates, similarities, experience_level, k)
+        else:
+            similarities = course_matrix @ user_embedding
+            top_recommendations = ranker.rank(similarities, experience_level, k)
         logger.info(f"Generated {len(top_recommendations)} recommendations")
         
-        return top_recommendations
+        if not _first_request_done:
+            _first_request_done = True
+            logger.info(f"First recommendation request served in {(time.perf_counter() - start) * 1000:.1f}ms")
+        
+        return {"recommendations": top_recommendations, "degraded": degraded}
         
     except Exception as e:
         logger.error(f"Error in recommendation system: {str(e)}")
-        return []
+        return {"recommendations": [], "degraded": degraded}
+
+def get_recommendations(user_responses: Dict[str, str], k: int = 3) -> List[Dict[str, Any]]:
+    """
+    Get course recommendations based on user responses.
+    
+    Parameters:
+    - user_responses: dict containing user answers to questions (see recommend)
+    - k: number of courses to return (default: 3)
+      
+    Returns:
+    - List of top k recommended courses as JSON-serializable objects
+    """
+    return recommend(user_responses, k)["recommendations"]
+
+def embed_batch_with_model(texts: List[str]) -> np.ndarray:
+    """
+    Embed many user texts, reusing cached vectors and encoding the misses in one model call.
+    
+    Raises:
+        EmbeddingUnavailableError: If the model is not loaded or fails to encode
+    """
+    keys = [cache_key(text, EMBEDDING_MODEL_NAME) for text in texts]
+    vectors: List[Optional[np.ndarray]] = [_cache.get(key) for key in keys]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    
+    if missing:
+        encoded = encode_texts([normalize_text(texts[i]) for i in missing])
+        if encoded is None:
+            raise EmbeddingUnavailableError("Embedding model is not available for batch encoding")
+        for row, i in enumerate(missing):
+            vectors[i] = encoded[row]
+            _cache.put(keys[i], encoded[row])
+    
+    return np.vstack(vectors).astype(np.float32)
+
+def get_recommendations_batch(
+    responses: Iterable[Dict[str, Any]],
+    k: int = 3,
+    batch_size: int = RECOMMENDATION_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    Get course recommendations for a cohort of users.
+    
+    Users are processed in batches: each batch is embedded with one model call
+    and scored against the whole catalog with a single matrix-matrix multiply.
+    Results are yielded as they are produced, so the cohort never has to be
+    held in memory.
+    
+    Parameters:
+    - responses: iterable of user response dicts (see recommend). An optional
+      "user_id" key is echoed back and not embedded.
+    - k: number of courses to return per user (default: 3)
+    - batch_size: users scored per matrix multiply (default: RECOMMENDATION_BATCH_SIZE)
+      
+    Returns:
+    - Iterator of dicts with "index", "user_id", "recommendations" and "degraded"
+    """
+    responses = iter(responses)
+    index = 0
+    while True:
+        batch = list(itertools.islice(responses, batch_size))
+        if not batch:
+            return
+        increment("recommendations", len(batch))
+        
+        texts = [build_user_text(user_responses) for user_responses in batch]
+        try:
+            user_embeddings = embed_batch_with_model(texts)
+            courses_data, course_matrix = load_course_embeddings(
+                encode_texts, EMBEDDING_MODEL_NAME, COURSES_PATH, prepare=get_course_index
+            )
+            degraded = False
+        except EmbeddingUnavailableError as e:
+            logger.warning(f"Batch recommendations running in degraded mode: {str(e)}")
+            user_embeddings = fallback_embed_batch(texts)
+            courses_data, course_matrix = load_course_embeddings(
+                fallback_embed_batch, FALLBACK_MODEL_NAME, COURSES_PATH, persist=False, prepare=get_course_index
+            )
+            degraded = True
+            increment("recommendations_degraded", len(batch))
+        
+        ranker = get_course_ranker(courses_data)
+        experience_levels = [user_responses.get("experience_level", "") for user_responses in batch]
+        
+        # Bound the (users x courses) score matrix so huge catalogs do not blow up memory
+        rows = max(1, min(len(batch), MAX_BATCH_SCORES // max(1, len(courses_data))))
+        for start in range(0, len(batch), rows):
+            block = normalize_rows(user_embeddings[start:start + rows])
+            similarities = block @ course_matrix.T
+            ranked = ranker.rank_batch(similarities, experience_levels[start:start + rows], k)
+            for offset, recommendations in enumerate(ranked):
+                user_responses = batch[start + offset]
+                yield {
+                    "index": index,
+                    "user_id": user_responses.get("user_id"),
+                    "recommendations": recommendations,
+                    "degraded": degraded
+                }
+                index += 1
 
 def get_user_questions():
     """
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from modules.media_backends import get_media_backend, MEDIA_CONCURRENCY, MEDIA_ITEM_RETRIES
+from modules.video_generation import create_video_story
+
+def _attempt(generate, prompt, retries):
+    """Call generate(prompt), retrying up to `retries` more times on failure"""
+    for attempt in range(retries + 1):
+        try:
+            return generate(prompt)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print(f"Generation failed ({e}); retrying")
+
+def generate_story_media(audio_prompt, image_prompts, backend=None, concurrency=MEDIA_CONCURRENCY,
+                         retries=MEDIA_ITEM_RETRIES, job=None, progress_share=0.8):
+    """
+    Generate a story's narration and all of its images concurrently.
+
+    The audio and every image are submitted to a thread pool at once, so the
+    whole set takes about as long as the slowest single generation (when
+    concurrency covers them all). Each item is retried on its own; an image that
+    still fails is left out and reported, while a failed narration, or every
+    image failing, fails the story.
+
+    Args:
+        audio_prompt: Prompt for the narration
+        image_prompts: Prompts for the images, in story order
+        backend: MediaBackend instance (default: get_media_backend())
+        concurrency: Maximum generations in flight at once
+        retries: Extra attempts per failed item (images: unless the backend sets image_retries)
+        job: Optional modules.job_queue.Job for progress reports and cancellation
+        progress_share: Fraction of the job's progress bar covered by this step
+
+    Returns:
+        (audio path, image paths in prompt order without failed ones, failures)
+        where failures is a list of {"index", "prompt", "error"} dicts
+    """
+    backend = backend or get_media_backend()
+    image_retries = retries if backend.image_retries is None else backend.image_retries
+    total = len(image_prompts) + 1
+    executor = ThreadPoolExecutor(max_workers=max(1, min(concurrency, total)), thread_name_prefix="media")
+    try:
+        audio_future = executor.submit(_attempt, backend.generate_audio, audio_prompt, retries)
+        image_futures = {
+            executor.submit(_attempt, backend.generate_image, prompt, image_retries): i
+            for i, prompt in enumerate(image_prompts)
+        }
+        image_files = [None] * len(image_prompts)
+        failures = []
+        for done, future in enumerate(as_completed([audio_future, *image_futures]), start=1):
+            if future is audio_future:
+                # Without narration there is no story, so stop without waiting for the images
+                audio_file = future.result()
+            else:
+                i = image_futures[future]
+                try:
+                    image_files[i] = future.result()
+                except Exception as e:
+                    print(f"Image {i + 1} failed: {e}")
+                    failures.append({"index": i, "prompt": image_prompts[i], "error": str(e)})
+            if job is not None:
+                job.update(progress_share * done / total, f"Generated {done} of {total} media files")
+    finally:
+        # On an error or cancellation, generations that have not started are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    image_files = [path for path in image_files if path is not None]
+    if not image_files:
+        raise ValueError(f"All {len(image_prompts)} images failed; first error: {failures[0]['error']}")
+    return audio_file, image_files, sorted(failures, key=lambda failure: failure["index"])
+
+def render_video_story(audio_prompt, image_prompts, profile=None, job=None, backend=None):
+    """
+    Generate the narration and images for a story and encode them into a video.
+
+    If `job` (a modules.job_queue.Job) is given, progress is reported as each
+    media file finishes (up to 80%) and when the encode is done. Cancelling the
+    job stops the render at the next report.
+
+    Returns:
+        Dict with the video path and the images that failed and were left out
+    """
+    if job is not None:
+        job.update(0.0, "Generating media")
+    audio_file, image_files, failures = generate_story_media(audio_prompt, image_prompts, backend=backend, job=job)
+    if job is not None:
+        job.update(0.8, "Encoding video")
+    video_file = create_video_story(audio_file, image_files, profile=profile)
+    return {"video_path": video_file, "failed_images": failures}
+
+def render_video_story_job(job, audio_prompt, image_prompts, profile=None):
+    """Job queue task wrapping render_video_story"""
+    return render_video_story(audio_prompt, image_prompts, profile=profile, job=job)
@@ -3,14 +3,73 @@ import json
 import base64
 import time
 import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from together import Together
 from dotenv import load_dotenv
+from modules.frame_manifest import FrameManifest
+from modules.image_cache import get_image_cache
 
 load_dotenv()
 TOGETHER_API_KEY = os.environ.get("TOGETHER_API_KEY")
+# Point the client at another server, e.g. a local stub (see experiments/together_stub_server.py)
+TOGETHER_BASE_URL = os.environ.get("TOGETHER_BASE_URL") or None
 DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
+# Seconds to establish a connection and to wait between bytes when downloading a rendered image
+DOWNLOAD_TIMEOUT = (
+    float(os.environ.get("IMAGE_DOWNLOAD_CONNECT_TIMEOUT", "5")),
+    float(os.environ.get("IMAGE_DOWNLOAD_READ_TIMEOUT", "60"))
+)
+# Keep-alive connections per host; should be at least the render concurrency
+DOWNLOAD_POOL_SIZE = int(os.environ.get("IMAGE_DOWNLOAD_POOL_SIZE", "16"))
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+class TokenBucket:
+    """Thread-safe token bucket: allows `rate` requests per second with bursts up to `capacity`"""
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` are available, then take them"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(requests_per_second):
+    """Return the process-wide token bucket for a request rate, so concurrent jobs share one budget"""
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(requests_per_second)
+        if limiter is None:
+            limiter = TokenBucket(requests_per_second)
+            _rate_limiters[requests_per_second] = limiter
+        return limiter
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def create_client():
+    """Create a Together client, honouring TOGETHER_BASE_URL for local stub servers"""
+    if TOGETHER_BASE_URL:
+        return Together(api_key=TOGETHER_API_KEY, base_url=TOGETHER_BASE_URL)
+    return Together(api_key=TOGETHER_API_KEY)
 
 def load_prompts(json_path):
     """Load prompts from a JSON file generated by SequentialImagePromptGenerator"""
@@ -18,30 +77,92 @@ def load_prompts(json_path):
         data = json.load(f)
     return data.get("prompts", [])
 
+def get_http_session():
+    """Return the process-wide pooled HTTP session used for image downloads
+    
+    Connections are kept alive and reused across frames and threads, so only the
+    first download to a host pays for the TCP and TLS handshake.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=DOWNLOAD_POOL_SIZE, pool_maxsize=DOWNLOAD_POOL_SIZE, max_retries=2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+def write_file_atomic(output_path, data):
+    """Write bytes to a temporary file next to output_path, then rename it into place"""
+    tmp_path = f"{output_path}.part-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
 def download_image(url, output_path):
-    """Download image from URL and save to the specified path"""
+    """Download image from URL and save to the specified path
+    
+    The body is streamed into a temporary file that is renamed over output_path only
+    once complete, so an interrupted download never looks like a finished frame.
+    """
+    tmp_path = None
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-                
+        with get_http_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            tmp_path = f"{output_path}.part-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, 'wb', buffering=DOWNLOAD_CHUNK_SIZE) as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+        os.replace(tmp_path, output_path)
         return output_path
     except Exception as e:
         raise Exception(f"Failed to download image from URL: {e}")
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-def generate_image_with_retry(client, prompt, model, output_path, steps=4, max_retries=6, base_delay=1.0):
-    """Generate an image with retry logic for rate limits"""
+def generate_image_with_retry(client, prompt, model, output_path, steps=4, max_retries=6, base_delay=1.0, rate_limiter=None, cache=None):
+    """Generate an image with retry logic for rate limits
+    
+    If a rate_limiter (TokenBucket) is given, a token is taken before every API call, retries included.
+    If an ImageCache is given, an identical earlier render (same prompt, model and steps) is linked
+    into output_path instead of calling the API, and new renders are added to the cache.
+    """
     # Validate steps parameter for FLUX model
     if "flux" in model.lower() and (steps < 1 or steps > 4):
         print(f"Warning: FLUX models require steps between 1-4. Adjusting from {steps} to 4.")
         steps = 4
-        
+    
+    if cache is not None and cache.fetch(prompt, model, steps, output_path):
+        print(f"Cache hit: reused cached image for {output_path}")
+        return output_path
+    
+    # output_path may be a hard link into the image cache from an earlier hit; never write through it
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+    
+    request_image(client, prompt, model, output_path, steps, max_retries, base_delay, rate_limiter)
+    
+    if cache is not None:
+        try:
+            cache.store(prompt, model, steps, output_path)
+        except Exception as e:
+            print(f"Warning: could not add image to cache: {e}")
+    return output_path
+
+def request_image(client, prompt, model, output_path, steps=4, max_retries=6, base_delay=1.0, rate_limiter=None):
+    """Call the image API, retrying on rate limits, and save the result to output_path"""
     retries = 0
     while retries <= max_retries:
         try:
+            if rate_limiter is not None:
+                rate_limiter.acquire()
             print(f"Sending request to Together API with model={model}, steps={steps}")
             print(f"Prompt: {prompt[:100]}..." if len(prompt) > 100 else f"Prompt: {prompt}")
             
@@ -79,8 +200,7 @@ def generate_image_with_retry(client, prompt, model, output_path, steps=4, max_r
             # Check for b64_json in response  
             elif hasattr(response.data[0], 'b64_json') and response.data[0].b64_json:
                 img_data = base64.b64decode(response.data[0].b64_json)
-                with open(output_path, 'wb') as img_file:
-                    img_file.write(img_data)
+                write_file_atomic(output_path, img_data)
                 print(f"Saved image to {output_path}")
                 return output_path
             
@@ -141,9 +261,33 @@ def generate_images_from_prompts(
     json_path, 
     output_dir="/Users/jeevanbhatta/SkillMitra/backend/outputs",
     model="black-forest-labs/FLUX.1-schnell-Free", 
-    steps=4
+    steps=4,
+    concurrency=1,
+    requests_per_second=2.0,
+    progress_callback=None,
+    resume=False,
+    use_cache=True
 ):
-    """Generate images from a sequence of prompts and save them with numerical order"""
+    """Generate images from a sequence of prompts and save them with numerical order
+    
+    A manifest.json next to the frames records the prompt hash, model, steps and
+    status of every frame. A failed frame does not stop the run; the remaining
+    frames are still generated.
+    
+    Args:
+        json_path: JSON file produced by SequentialImagePromptGenerator
+        output_dir: Directory for frame_0001.png, frame_0002.png, ...
+        model: Together image model
+        steps: Diffusion steps (1-4 for FLUX models)
+        concurrency: Maximum number of requests in flight at once
+        requests_per_second: Shared token-bucket rate limit for API calls
+        progress_callback: Optional callable(completed, total) called after each frame
+        resume: Skip frames the manifest records as done whose files still verify
+        use_cache: Reuse identical earlier renders from the shared image cache
+        
+    Returns:
+        List of generated frame paths in frame order
+    """
     # Create the output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     
@@ -155,27 +299,66 @@ def generate_images_from_prompts(
     
     print(f"Loaded {len(prompts)} prompts from {json_path}")
     
-    # Initialize Together client
-    client = Together(api_key=TOGETHER_API_KEY)
+    total = len(prompts)
+    # Frame numbers are fixed by prompt position, so output order never depends on completion order
+    output_paths = [os.path.join(output_dir, f"frame_{i+1:04d}.png") for i in range(total)]
+    succeeded = [False] * total
     
-    # Generate images for each prompt
-    generated_paths = []
+    manifest = FrameManifest.load(output_dir, os.path.abspath(json_path)) if resume else FrameManifest(output_dir, os.path.abspath(json_path))
+    pending = []
     for i, prompt in enumerate(prompts):
-        print(f"\nGenerating image {i+1}/{len(prompts)}")
-        output_path = os.path.join(output_dir, f"frame_{i+1:04d}.png")
-        
+        if resume and manifest.is_complete(i + 1, prompt, model, steps, output_paths[i]):
+            succeeded[i] = True
+        else:
+            pending.append(i)
+            manifest.update(i + 1, prompt, model, steps, "pending", output_paths[i], save=False)
+    manifest.save()
+    
+    if resume:
+        print(f"Resuming: {total - len(pending)} frames already complete, {len(pending)} to generate")
+    if not pending:
+        return output_paths
+    
+    # Initialize Together client
+    client = create_client()
+    rate_limiter = get_rate_limiter(requests_per_second)
+    cache = get_image_cache() if use_cache else None
+    progress_lock = threading.Lock()
+    completed = total - len(pending)
+    
+    def render(i):
+        nonlocal completed
+        print(f"\nGenerating image {i+1}/{total}")
         try:
-            generate_image_with_retry(client, prompt, model, output_path, steps)
-            generated_paths.append(output_path)
-            
-            # Add a small delay between requests to avoid rate limiting
-            if i < len(prompts) - 1:
-                time.sleep(0.5)
+            generate_image_with_retry(client, prompts[i], model, output_paths[i], steps, rate_limiter=rate_limiter, cache=cache)
         except Exception as e:
-            print(f"Error generating image {i+1}: {str(e)}")
-            print(f"Stopping generation. {len(generated_paths)} images were successfully generated.")
-            break
+            manifest.update(i + 1, prompts[i], model, steps, "failed", output_paths[i], error=e)
+            raise
+        manifest.update(i + 1, prompts[i], model, steps, "done", output_paths[i])
+        succeeded[i] = True
+        with progress_lock:
+            completed += 1
+            print(f"Progress: {completed}/{total} frames")
+            if progress_callback is not None:
+                progress_callback(completed, total)
+    
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(render, i): i for i in pending}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error generating image {futures[future]+1}: {str(e)}")
     
+    generated_paths = [path for path, ok in zip(output_paths, succeeded) if ok]
+    print(f"{len(generated_paths)} of {total} images were successfully generated.")
+    if failed:
+        print(f"{failed} frames failed; rerun with resume=True (--resume) to retry only those frames.")
+    if cache is not None:
+        report = cache.report()
+        print(f"Image cache: {report['hit_rate']:.0%} hit rate, {report['bytes_saved'] / 1024 ** 2:.1f} MB of renders reused")
     return generated_paths
 
 if __name__ == "__main__":
@@ -186,6 +369,10 @@ if __name__ == "__main__":
     parser.add_argument('json_path', help='Path to JSON file with prompts')
     parser.add_argument('--model', default="black-forest-labs/FLUX.1-schnell-Free", help='Model to use')
     parser.add_argument('--steps', type=int, default=4, help='Number of diffusion steps (1-4 for FLUX models)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Maximum number of image requests in flight')
+    parser.add_argument('--rps', type=float, default=2.0, help='Maximum API requests per second')
+    parser.add_argument('--output-dir', default="/Users/jeevanbhatta/SkillMitra/backend/outputs", help='Directory for the frames')
+    parser.add_argument('--resume', action='store_true', help='Skip frames already completed in a previous run')
     parser.add_argument('--debug', action='store_true', help='Enable debug output')
     
     args = parser.parse_args()
@@ -198,6 +385,7 @@ if __name__ == "__main__":
     print(f"JSON Path: {args.json_path}")
     print(f"Model: {args.model}")
     print(f"Steps: {args.steps}")
+    print(f"Concurrency: {args.concurrency} (max {args.rps} requests/s)")
     print(f"Debug: {DEBUG}")
     
     if not TOGETHER_API_KEY:
@@ -208,7 +396,15 @@ if __name__ == "__main__":
         
     print(f"\nAPI Key (masked): {TOGETHER_API_KEY[:4]}...{TOGETHER_API_KEY[-4:] if len(TOGETHER_API_KEY) > 8 else ''}")
     
-    generate_images_from_prompts(args.json_path, model=args.model, steps=args.steps)
+    generate_images_from_prompts(
+        args.json_path,
+        output_dir=args.output_dir,
+        resume=args.resume,
+        model=args.model,
+        steps=args.steps,
+        concurrency=args.concurrency,
+        requests_per_second=args.rps
+    )
     
     print("\n=== Troubleshooting Tips ===")
     print("1. Make sure your Together API key is correct and has access to the model")
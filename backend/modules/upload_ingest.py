@@ -0,0 +1,134 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from modules.data_preprocessing import clean_csv_stream
+
+# Processes that clean uploads, so pandas work never holds the web workers' GIL; 0 cleans in the request thread
+PREPROCESS_WORKERS = int(os.environ.get("PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Uploads up to this size stay in memory; larger ones are spooled to one temporary file
+UPLOAD_MEMORY_BYTES = int(os.environ.get("UPLOAD_MEMORY_BYTES", str(1024 ** 2)))
+# Where large uploads are spooled; they are deleted once cleaned
+UPLOAD_SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR", "temp")
+SPOOL_CHUNK_SIZE = 1 << 20
+
+def _spool_file():
+    os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+    return tempfile.NamedTemporaryFile("wb+", dir=UPLOAD_SPOOL_DIR, prefix="upload_", suffix=".part", delete=False)
+
+def upload_stream_factory(spool_files):
+    """
+    Return a Werkzeug stream factory for one request's preprocessing uploads:
+    small uploads are kept in memory, larger ones are written once, as they
+    arrive, into a named temporary file that a preprocessing worker process can
+    open by path. Every spool file created is appended to `spool_files`, so the
+    caller can delete them even if the body breaks off partway through parsing.
+    """
+    def factory(total_content_length, content_type, filename, content_length=None):
+        if total_content_length is not None and total_content_length <= UPLOAD_MEMORY_BYTES:
+            return io.BytesIO()
+        spool = _spool_file()
+        spool_files.append(spool)
+        return spool
+    return factory
+
+class IncompleteUpload(ValueError):
+    """The request body ended before all of its declared bytes arrived"""
+
+def spool_stream(stream, content_length=None):
+    """
+    Copy a raw request body into a named temporary file, for a worker process to
+    read. Raises IncompleteUpload if the body is shorter than content_length.
+    """
+    spooled = _spool_file()
+    try:
+        try:
+            shutil.copyfileobj(stream, spooled, SPOOL_CHUNK_SIZE)
+        except (OSError, ValueError) as e:
+            raise IncompleteUpload(f"upload broke off: {e}")
+        if content_length is not None and spooled.tell() != content_length:
+            raise IncompleteUpload(f"received {spooled.tell()} of {content_length} bytes")
+        spooled.flush()
+    except BaseException:
+        discard_upload(spooled)
+        raise
+    return spooled
+
+def discard_upload(stream):
+    """Close an upload stream and delete its spool file, if it has one"""
+    stream.close()
+    name = getattr(stream, "name", None)
+    if isinstance(name, str) and os.path.exists(name):
+        os.remove(name)
+
+def clean_upload(source, output_path, output_format="csv"):
+    """Clean an upload given as a path, raw bytes or a binary stream; runs in a worker process or inline"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return clean_csv_stream(source, output_path, output_format=output_format)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_preprocess_pool():
+    """
+    Return this process's preprocessing pool, or None if PREPROCESS_WORKERS is 0.
+    Workers are spawned rather than forked, so they do not inherit the web
+    server's threads or loaded models.
+    """
+    global _pool
+    if PREPROCESS_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PREPROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+def preprocess_upload(stream, output_path, output_format="csv", content_length=None):
+    """
+    Clean an uploaded CSV without copying it again.
+
+    With a worker pool, an in-memory upload is sent to a worker as bytes and a
+    spooled one by its path (a raw body stream is spooled first). Without one,
+    the stream is parsed in place, straight from the request if it is the raw
+    body. The caller still owns `stream` and should pass it to discard_upload.
+    Pass content_length for a raw request body: it is always spooled, and a
+    body shorter than content_length raises IncompleteUpload.
+
+    Returns:
+        clean_csv_stream's stats
+    """
+    pool = get_preprocess_pool()
+    if pool is None:
+        if stream.seekable():
+            stream.seek(0)
+        return clean_upload(stream, output_path, output_format)
+
+    spooled = None
+    try:
+        if content_length is None and isinstance(stream, io.BytesIO):
+            source = stream.getvalue()
+        elif content_length is None and isinstance(getattr(stream, "name", None), str):
+            stream.flush()
+            source = stream.name
+        else:
+            spooled = spool_stream(stream, content_length)
+            source = spooled.name
+        try:
+            return pool.submit(clean_upload, source, output_path, output_format).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); start a fresh pool for the next upload
+            _reset_pool()
+            raise ValueError("Error processing data: preprocessing worker exited unexpectedly")
+    finally:
+        if spooled is not None:
+            discard_upload(spooled)
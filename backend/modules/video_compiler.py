@@ -1,8 +1,14 @@
 import os
 import re
 import glob
-from moviepy.editor import ImageSequenceClip
+import tempfile
+import subprocess
+from moviepy.config import get_setting
 from PIL import Image
+from modules.encoding_profiles import ENCODING_PROFILES, get_profile, profile_size, ffmpeg_video_args
+
+# moviepy resolves the ffmpeg binary (FFMPEG_BINARY env var, else the one bundled with imageio-ffmpeg)
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
 
 def natural_sort_key(s):
     """Sort strings with embedded numbers in natural order"""
@@ -18,26 +24,122 @@ def get_image_dimensions(image_path):
     with Image.open(image_path) as img:
         return img.size
 
+class FrameStreamEncoder:
+    """
+    Encode frames one at a time as they become available.
+    
+    Each frame is decoded once and piped as raw RGB into an ffmpeg subprocess, so
+    only the current frame is held in memory regardless of the frame count, and
+    encoding can start before the last frame exists. Unless `size` is given, the
+    first frame fixes the video size (capped by the profile's max_height and
+    rounded down to even dimensions for yuv420p); only frames with different
+    dimensions are resized.
+    """
+    
+    def __init__(self, output_path, fps=12, size=None, profile=None):
+        self.output_path = output_path
+        self.fps = fps
+        self.profile = profile if isinstance(profile, dict) else get_profile(profile)
+        self.resample = getattr(Image, self.profile.get("resample", "lanczos").upper())
+        self.size = profile_size({}, size) if size else None
+        self.frames_written = 0
+        self.source_size = None
+        self.resized_frames = 0
+        self.process = None
+        self.stderr = None
+    
+    def _start(self):
+        width, height = self.size
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_path)), exist_ok=True)
+        command = [
+            FFMPEG_BINARY, "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(self.fps), "-i", "-",
+            "-an", *ffmpeg_video_args(self.profile), self.output_path
+        ]
+        # stderr goes to a file so a chatty ffmpeg can never fill a pipe and stall the encoder
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.stderr)
+    
+    def _error(self):
+        self.stderr.seek(0)
+        message = self.stderr.read().decode("utf-8", "replace").strip()
+        return IOError(f"ffmpeg failed to encode {self.output_path}: {message[-2000:] or 'no error output'}")
+    
+    def write(self, frame):
+        """Append a frame, given as a PIL image or an image file path"""
+        if isinstance(frame, (str, os.PathLike)):
+            with Image.open(frame) as img:
+                return self.write(img)
+        image = frame if frame.mode == "RGB" else frame.convert("RGB")
+        if self.source_size is None:
+            self.source_size = image.size
+        elif image.size != self.source_size:
+            self.resized_frames += 1
+        if self.size is None:
+            self.size = profile_size(self.profile, image.size)
+        if image.size != self.size:
+            image = image.resize(self.size, self.resample)
+        if self.process is None:
+            self._start()
+        try:
+            self.process.stdin.write(image.tobytes())
+        except BrokenPipeError:
+            self.process.wait()
+            raise self._error()
+        self.frames_written += 1
+    
+    def close(self):
+        """Finish the video file; returns its path, or None if no frame was written"""
+        if self.process is None:
+            return None
+        process, self.process = self.process, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if process.wait() != 0:
+            raise self._error()
+        self.stderr.close()
+        return self.output_path
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self.process is not None:
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
 def create_video_from_frames(
     frames_dir,
     output_path=None,
     fps=12,
     pattern="frame_*.png",
-    resize=None
+    resize=None,
+    profile=None
 ):
     """
     Create a video from a sequence of image frames.
     
+    Frames are streamed to ffmpeg one at a time, so memory use does not grow with
+    the number of frames. Frames whose size differs from the first frame (or from
+    `resize`) are resized on the way; all others are passed through untouched.
+    
     Args:
         frames_dir: Directory containing the frame images
         output_path: Path to save the output video (default: in frames_dir as 'output.mp4')
         fps: Frames per second (default: 24)
         pattern: File pattern to match frame images (default: "frame_*.png")
         resize: Optional tuple (width, height) to resize frames (default: None)
+        profile: Encoding profile name, see modules/encoding_profiles.py (default: VIDEO_PROFILE or "standard")
         
     Returns:
         Path to the created video file
     """
+    profile = get_profile(profile)
     if not os.path.exists(frames_dir):
         raise ValueError(f"Frames directory not found: {frames_dir}")
         
@@ -53,43 +155,14 @@ def create_video_from_frames(
     if output_path is None:
         output_path = os.path.join(frames_dir, "output.mp4")
     
-    # Create output directory if it doesn't exist
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Get dimensions of first frame for consistency check
-    first_frame_dimensions = get_image_dimensions(frame_files[0])
-    
-    # Check if all frames have the same dimensions
-    consistent_dimensions = True
-    for frame in frame_files[1:]:
-        if get_image_dimensions(frame) != first_frame_dimensions:
-            print(f"Warning: Inconsistent frame dimensions detected. {frame} differs from the first frame.")
-            consistent_dimensions = False
-            break
-            
-    if not consistent_dimensions and resize is None:
-        # Default to the dimensions of the first frame if frames are inconsistent
-        resize = first_frame_dimensions
-        print(f"Setting all frames to consistent size: {resize}")
-    
-    # Create video clip from image sequence
-    clip = ImageSequenceClip(frame_files, fps=fps)
-    
-    # Resize if needed
-    if resize:
-        clip = clip.resize(width=resize[0], height=resize[1])
-    
     # Write video file
-    print(f"Creating video at {fps} FPS...")
-    clip.write_videofile(
-        output_path,
-        fps=fps,
-        codec="libx264",
-        audio=False,
-        preset="medium",
-        threads=4
-    )
+    print(f"Creating video at {fps} FPS with the '{profile['name']}' profile...")
+    with FrameStreamEncoder(output_path, fps=fps, size=resize, profile=profile) as encoder:
+        for frame in frame_files:
+            encoder.write(frame)
     
+    if encoder.resized_frames:
+        print(f"Warning: {encoder.resized_frames} frames differed in size from the first frame and were resized to {encoder.size[0]}x{encoder.size[1]}")
     print(f"Video saved to: {output_path}")
     return output_path
 
@@ -109,6 +182,8 @@ if __name__ == "__main__":
                         help="Resize video width")
     parser.add_argument("--height", type=int, default=None, 
                         help="Resize video height")
+    parser.add_argument("--profile", choices=list(ENCODING_PROFILES), default=None,
+                        help="Encoding profile (default: VIDEO_PROFILE or standard)")
     
     args = parser.parse_args()
     
@@ -122,7 +197,8 @@ if __name__ == "__main__":
             args.output,
             args.fps,
             args.pattern,
-            resize
+            resize,
+            args.profile
         )
         print(f"Video creation successful!")
     except Exception as e:
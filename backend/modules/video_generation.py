@@ -1,26 +1,150 @@
 import os
+import re
 import uuid
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+from PIL import Image
+from moviepy.config import get_setting
 from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
+from modules.encoding_profiles import get_profile, profile_size, moviepy_write_kwargs
 
-def create_video_story(audio_path, image_paths):
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
+# Frame rate of still-image slideshows; each still is encoded once and then repeated almost for free
+SLIDESHOW_FPS = float(os.environ.get("SLIDESHOW_FPS", "2"))
+# Set VIDEO_SLIDESHOW_FASTPATH=off to always render stories through moviepy
+SLIDESHOW_FASTPATH = os.environ.get("VIDEO_SLIDESHOW_FASTPATH", "on").lower() != "off"
+
+_DURATION = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_AUDIO_CODEC = re.compile(r"Audio:\s*([\w-]+)")
+
+def probe_audio(audio_path):
+    """Return (duration in seconds, codec name) of an audio file, read from ffmpeg's stream info"""
+    result = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", audio_path],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = result.stderr.decode("utf-8", "replace")
+    duration, codec = _DURATION.search(info), _AUDIO_CODEC.search(info)
+    if duration is None or codec is None:
+        raise ValueError(f"Could not read audio stream from {audio_path}")
+    hours, minutes, seconds = duration.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds), codec.group(1)
+
+def _concat_quote(path):
+    """Quote a path for an ffmpeg concat script"""
+    return "'" + path.replace("'", "'\\''") + "'"
+
+def _load_still(image_path, profile, size=None):
+    """Load an image as RGB, scaled to `size` (default: the profile's resolution) if needed"""
+    with Image.open(image_path) as img:
+        image = img.convert("RGB")
+    size = size or profile_size(profile, image.size)
+    if image.size != size:
+        image = image.resize(size, Image.LANCZOS)
+    return image
+
+def create_slideshow(audio_path, image_paths, output_path, profile=None, fps=SLIDESHOW_FPS):
+    """
+    Encode a still-image slideshow with ffmpeg directly.
+
+    The stills are listed in an ffmpeg concat demuxer script with their
+    durations, so each image is decoded once and x264 (tuned for still images)
+    spends almost nothing on the repeated frames at a low frame rate. AAC audio
+    is copied into the output unchanged; other codecs are transcoded to AAC.
+
+    Args:
+        audio_path: Narration track; its duration sets the video length
+        image_paths: Stills, each shown for an equal share of the audio
+        output_path: Output .mp4 path
+        profile: Encoding profile name or settings (default: VIDEO_PROFILE or "standard")
+        fps: Output frame rate (default: SLIDESHOW_FPS)
+
+    Returns:
+        output_path
+    """
+    profile = profile if isinstance(profile, dict) else get_profile(profile)
+    duration, audio_codec = probe_audio(audio_path)
+    image_duration = duration / len(image_paths)
+
+    workdir = tempfile.mkdtemp(prefix="slideshow_")
+    try:
+        # The concat demuxer needs every still at the same size; only stills that differ are rewritten
+        size = None
+        stills = []
+        for i, path in enumerate(image_paths):
+            with Image.open(path) as img:
+                native_size, native_mode, native_format = img.size, img.mode, img.format
+            size = size or profile_size(profile, native_size)
+            if native_size == size and native_mode == "RGB" and native_format in ("PNG", "JPEG"):
+                stills.append(os.path.abspath(path))
+            else:
+                still = os.path.join(workdir, f"still_{i:04d}.png")
+                _load_still(path, profile, size).save(still)
+                stills.append(still)
+
+        concat_path = os.path.join(workdir, "stills.txt")
+        with open(concat_path, "w") as f:
+            f.write("ffconcat version 1.0\n")
+            for still in stills:
+                f.write(f"file {_concat_quote(still)}\nduration {image_duration:.3f}\n")
+            # The demuxer ignores the duration of the last entry unless the file is listed again
+            f.write(f"file {_concat_quote(stills[-1])}\n")
+
+        video_args = [
+            "-vf", f"fps={fps:g},format=yuv420p",
+            "-c:v", profile["codec"], "-preset", profile["preset"], "-crf", str(profile["crf"]),
+            "-tune", "stillimage", "-g", str(max(1, round(fps * image_duration))),
+            "-threads", str(profile["threads"])
+        ]
+        if profile.get("maxrate"):
+            video_args += ["-maxrate", profile["maxrate"], "-bufsize", profile["bufsize"]]
+        audio_args = ["-c:a", "copy"] if audio_codec == "aac" else ["-c:a", "aac", "-b:a", profile["audio_bitrate"]]
+        command = [
+            FFMPEG_BINARY, "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", concat_path,
+            "-i", audio_path,
+            "-map", "0:v:0", "-map", "1:a:0",
+            *video_args, *audio_args,
+            "-movflags", "+faststart", "-shortest", output_path
+        ]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise IOError(f"ffmpeg failed to render slideshow: {result.stderr.decode('utf-8', 'replace').strip()[-2000:]}")
+        return output_path
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _create_video_story_moviepy(audio_path, image_paths, video_path, profile):
+    audio_clip = AudioFileClip(audio_path)
+    num_images = len(image_paths)
+    image_duration = audio_clip.duration / num_images
+
+    clips = []
+    for img in image_paths:
+        clip = ImageClip(np.asarray(_load_still(img, profile))).set_duration(image_duration)
+        clips.append(clip)
+
+    video = concatenate_videoclips(clips, method="compose")
+    video = video.set_audio(audio_clip)
+    video.write_videofile(video_path, fps=24, audio_codec="aac", **moviepy_write_kwargs(profile))
+    return video_path
+
+def create_video_story(audio_path, image_paths, profile=None):
     """
     Creates a video by stitching together an audio track with a sequence of images.
     Each image is shown for an equal portion of the audio's duration.
+    `profile` names an encoding profile (see modules/encoding_profiles.py).
+    Stories are rendered through the ffmpeg slideshow fast path (see create_slideshow);
+    if that fails, they fall back to a full 24 fps moviepy render.
     """
+    profile = get_profile(profile)
+    video_path = f"outputs/video_{uuid.uuid4()}.mp4"
     try:
-        audio_clip = AudioFileClip(audio_path)
-        num_images = len(image_paths)
-        image_duration = audio_clip.duration / num_images
-
-        clips = []
-        for img in image_paths:
-            clip = ImageClip(img).set_duration(image_duration)
-            clips.append(clip)
-
-        video = concatenate_videoclips(clips, method="compose")
-        video = video.set_audio(audio_clip)
-        video_path = f"outputs/video_{uuid.uuid4()}.mp4"
-        video.write_videofile(video_path, fps=24, codec="libx264", audio_codec="aac")
-        return video_path
+        if SLIDESHOW_FASTPATH:
+            try:
+                return create_slideshow(audio_path, image_paths, video_path, profile)
+            except Exception as e:
+                print(f"Slideshow fast path failed, rendering with moviepy instead: {e}")
+        return _create_video_story_moviepy(audio_path, image_paths, video_path, profile)
     except Exception as e:
         raise ValueError(f"Error creating video: {e}")
@@ -1,6 +1,11 @@
+import os
 import uuid
 from flask import Blueprint, request, jsonify
-from modules.data_preprocessing import clean_and_preprocess_data
+from werkzeug.exceptions import BadRequest
+from werkzeug.formparser import parse_form_data
+from werkzeug.utils import secure_filename
+from modules.data_preprocessing import PREPROCESS_OUTPUT_FORMAT, check_output_format
+from modules.upload_ingest import upload_stream_factory, preprocess_upload, discard_upload, IncompleteUpload
 
 data_bp = Blueprint('data_bp', __name__)
 
@@ -8,19 +13,59 @@ data_bp = Blueprint('data_bp', __name__)
 def preprocess():
     """
     Endpoint to upload and preprocess CSV data.
-    Expects a file upload via a multipart/form-data POST.
+    Accepts either:
+      - multipart/form-data with the CSV in a 'file' field
+      - the CSV itself as the request body (text/csv), named by an optional 'filename' query parameter
+    An optional 'format' field or query parameter (csv, parquet or feather; default PREPROCESS_OUTPUT_FORMAT)
+    selects the output file format. Parquet and Feather output use compact column dtypes.
+    The upload is parsed where it lands (in memory, or in one spool file for large uploads)
+    and is deleted afterwards; only the cleaned file is kept.
     """
-    file = request.files.get('file')
-    if not file:
-        return jsonify({'error': 'No file uploaded'}), 400
+    spool_files = []
+    files = None
+    try:
+        if request.mimetype == 'multipart/form-data':
+            # Parsed here instead of through request.files, so large uploads go straight into a spool file
+            try:
+                _, form, files = parse_form_data(
+                    request.environ, stream_factory=upload_stream_factory(spool_files),
+                    max_content_length=request.max_content_length, silent=False
+                )
+            except BadRequest:
+                return jsonify({'error': 'Upload is incomplete: the request body ended early'}), 400
+            except ValueError as e:
+                return jsonify({'error': f'Upload is incomplete or malformed: {e}'}), 400
+            file = files.get('file')
+            stream, name = (file.stream, file.filename) if file else (None, None)
+        else:
+            form = request.args
+            stream = request.stream if request.mimetype in ('text/csv', 'application/octet-stream') else None
+            name = request.args.get('filename')
 
-    filename = f"temp/{uuid.uuid4()}_{file.filename}"
-    file.save(filename)
+        if stream is None:
+            return jsonify({'error': 'No file uploaded'}), 400
+        output_format = form.get('format') or request.args.get('format', PREPROCESS_OUTPUT_FORMAT)
+        try:
+            check_output_format(output_format)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-    try:
-        df = clean_and_preprocess_data(filename)
-        cleaned_file = filename.replace('.csv', '_cleaned.csv')
-        df.to_csv(cleaned_file, index=False)
-        return jsonify({'message': 'Preprocessing complete', 'cleaned_data_path': cleaned_file})
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        stem = os.path.splitext(secure_filename(name or '') or 'upload')[0]
+        cleaned_file = f"temp/{uuid.uuid4()}_{stem}_cleaned.{output_format}"
+        try:
+            # Cleaned in chunks by a worker process, so multi-GB exports neither fit in memory nor hold the GIL
+            content_length = None if files is not None else request.content_length
+            stats = preprocess_upload(stream, cleaned_file, output_format=output_format, content_length=content_length)
+            return jsonify({'message': 'Preprocessing complete', 'cleaned_data_path': cleaned_file, 'stats': stats})
+        except BadRequest:
+            return jsonify({'error': 'Upload is incomplete: the request body ended early'}), 400
+        except IncompleteUpload as e:
+            return jsonify({'error': f'Upload is incomplete: {e}'}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    finally:
+        # Spool files are deleted even when the body broke off before the parser returned them
+        for _, upload in (files.items(multi=True) if files else []):
+            upload.close()
+        for spool in spool_files:
+            discard_upload(spool)
@@ -1,4 +1,6 @@
 from flask import Blueprint, jsonify
+from modules.recommendation import get_model_status
+from modules.metrics import collect
 
 home_bp = Blueprint('home', __name__)
 
@@ -13,3 +15,18 @@ def home():
             "recommendation": "/recommendation"
         }
     })
+
+@home_bp.route('/ready')
+def ready():
+    """
+    Readiness probe: returns 200 once the embedding model is loaded, 503 before.
+    """
+    status = get_model_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@home_bp.route('/metrics')
+def metrics():
+    """
+    Returns process-wide counters and cache statistics as JSON.
+    """
+    return jsonify(collect())
@@ -1,8 +1,10 @@
+import os
 import uuid
-from flask import Blueprint, request, jsonify, send_file
-from modules.audio_generation import generate_audio
-from modules.image_generation import generate_image
-from modules.video_generation import create_video_story
+from flask import Blueprint, request, jsonify, send_file, url_for
+from modules.media_backends import get_media_backend
+from modules.encoding_profiles import ENCODING_PROFILES
+from modules.story_rendering import render_video_story, render_video_story_job
+from modules.job_queue import get_job_queue, QueueFull, SUCCEEDED, FINISHED_STATES
 
 media_bp = Blueprint('media_bp', __name__)
 
@@ -17,7 +19,7 @@ def generate_audio_route():
         return jsonify({'error': 'No prompt provided'}), 400
 
     try:
-        audio_file = generate_audio(prompt)
+        audio_file = get_media_backend().generate_audio(prompt)
         return send_file(audio_file, as_attachment=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -33,30 +35,103 @@ def generate_image_route():
         return jsonify({'error': 'No prompt provided'}), 400
 
     try:
-        image_file = generate_image(prompt)
+        image_file = get_media_backend().generate_image(prompt)
         return send_file(image_file, as_attachment=True)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _video_request():
+    """Validate a generate-video JSON payload; returns (params, None) or (None, error response)"""
+    data = request.get_json(silent=True)
+    if not data or 'audio_prompt' not in data or 'image_prompts' not in data:
+        return None, (jsonify({'error': 'Invalid payload. "audio_prompt" and "image_prompts" are required.'}), 400)
+    if not isinstance(data['image_prompts'], list) or not data['image_prompts']:
+        return None, (jsonify({'error': '"image_prompts" must be a non-empty list.'}), 400)
+    profile = data.get('profile')
+    if profile is not None and profile not in ENCODING_PROFILES:
+        return None, (jsonify({'error': f'Unknown profile. Choose one of: {", ".join(ENCODING_PROFILES)}'}), 400)
+    return {'audio_prompt': data['audio_prompt'], 'image_prompts': data['image_prompts'], 'profile': profile}, None
+
 @media_bp.route('/generate-video', methods=['POST'])
 def generate_video_route():
     """
-    Endpoint to generate a video story.
+    Endpoint to generate a video story and return it in the response.
     Expects a JSON payload with:
       - audio_prompt: text prompt for audio generation.
       - image_prompts: list of text prompts for image generation.
+      - profile (optional): encoding profile, one of preview, standard, mobile, archive.
+    Long renders should use /media/jobs/generate-video instead.
+    Images that failed to generate are left out and listed (by index) in the X-Failed-Images header.
     """
-    data = request.get_json()
-    if not data or 'audio_prompt' not in data or 'image_prompts' not in data:
-        return jsonify({'error': 'Invalid payload. "audio_prompt" and "image_prompts" are required.'}), 400
+    params, error = _video_request()
+    if error:
+        return error
 
     try:
-        # Generate audio from the prompt
-        audio_file = generate_audio(data['audio_prompt'])
-        # Generate images for each provided image prompt
-        image_files = [generate_image(prompt) for prompt in data['image_prompts']]
-        # Create the video story using generated audio and images
-        video_file = create_video_story(audio_file, image_files)
-        return send_file(video_file, as_attachment=True)
+        result = render_video_story(**params)
+        response = send_file(result['video_path'], as_attachment=True)
+        if result['failed_images']:
+            response.headers['X-Failed-Images'] = ','.join(str(failure['index']) for failure in result['failed_images'])
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@media_bp.route('/jobs/generate-video', methods=['POST'])
+def submit_video_job():
+    """
+    Queue a video story render and return its job ID at once (202).
+    Takes the same JSON payload as /media/generate-video.
+    Poll /media/jobs/<job_id> for progress and fetch /media/jobs/<job_id>/result when it has succeeded.
+    """
+    params, error = _video_request()
+    if error:
+        return error
+
+    try:
+        job_id = get_job_queue().submit('generate-video', render_video_story_job, params)
+    except QueueFull as e:
+        return jsonify({'error': f'Render queue is full, try again later ({e})'}), 503, {'Retry-After': '30'}
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('media_bp.video_job_status', job_id=job_id),
+        'result_url': url_for('media_bp.video_job_result', job_id=job_id)
+    }), 202
+
+@media_bp.route('/jobs/<job_id>', methods=['GET'])
+def video_job_status(job_id):
+    """
+    Endpoint to get a job's status (queued, running, succeeded, failed, cancelled), progress (0-1) and message.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@media_bp.route('/jobs/<job_id>/result', methods=['GET'])
+def video_job_result(job_id):
+    """
+    Endpoint to download the video of a succeeded job; 409 while the job is unfinished or if it did not succeed.
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] != SUCCEEDED:
+        return jsonify({'error': f'Job is {job["status"]}', 'status': job['status']}), 409
+    video_file = job['result']['video_path']
+    if not os.path.exists(video_file):
+        return jsonify({'error': 'Video file is no longer available'}), 410
+    return send_file(os.path.abspath(video_file), as_attachment=True)
+
+@media_bp.route('/jobs/<job_id>', methods=['DELETE'])
+@media_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_video_job(job_id):
+    """
+    Endpoint to cancel a job. A queued job is cancelled at once; a running one stops at its next step.
+    """
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] in FINISHED_STATES and not job['cancel_requested']:
+        return jsonify({'error': f'Job already {job["status"]}', 'status': job['status']}), 409
+    return jsonify(job), 202 if job['status'] not in FINISHED_STATES else 200
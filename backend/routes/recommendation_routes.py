@@ -1,5 +1,7 @@
-from flask import Blueprint, request, jsonify
-from modules.recommendation import get_recommendations
+import json
+import itertools
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from modules.recommendation import recommend, get_recommendations_batch, RECOMMENDATION_BATCH_SIZE
 
 recommendation_bp = Blueprint('recommendation_bp', __name__)
 
@@ -9,5 +11,105 @@ def recommendations():
     Endpoint to get course recommendations based on a user_id query parameter.
     """
     user_id = request.args.get('user_id', '')
-    recs = get_recommendations(user_id)
-    return jsonify({'user_id': user_id, 'recommendations': recs})
+    result = recommend(user_id)
+    return jsonify({'user_id': user_id, 'recommendations': result['recommendations'], 'degraded': result['degraded']})
+
+def _read_ndjson(stream):
+    """
+    Yield (line number, response dict or None, error or None) for each non-empty
+    line of an NDJSON request body, so one bad line does not stop the others.
+    """
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        yield number, *_check_entry(entry)
+
+def _check_entry(entry):
+    """Return (entry, None) for a valid user response dict, or (None, error)."""
+    if not isinstance(entry, dict):
+        return None, "Expected a JSON object of user responses"
+    return entry, None
+
+def _parse_k(value):
+    """Return k as a positive int, or raise ValueError."""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, str):
+        value = value.strip()
+    k = int(value)
+    if k < 1 or (isinstance(value, float) and value != k):
+        raise ValueError(value)
+    return k
+
+def _score_entries(entries, k):
+    """
+    Score (line number, response, error) entries in micro-batches, yielding one
+    result dict per entry in input order: recommendations for valid entries and
+    an error for invalid ones. Only the valid entries of a micro-batch are scored.
+    """
+    index = 0
+    while True:
+        chunk = list(itertools.islice(entries, RECOMMENDATION_BATCH_SIZE))
+        if not chunk:
+            return
+        valid = [response for _, response, error in chunk if error is None]
+        results = iter(get_recommendations_batch(valid, k=k, batch_size=max(1, len(valid)))) if valid else iter(())
+        for line, response, error in chunk:
+            if error is None:
+                result = next(results)
+            else:
+                result = {"error": error}
+            result["index"] = index
+            if line is not None:
+                result["line"] = line
+            index += 1
+            yield result
+
+@recommendation_bp.route('/batch', methods=['POST'])
+def recommendations_batch():
+    """
+    Endpoint to score a cohort of users in one request.
+    Accepts either:
+      - application/x-ndjson: one user response dict per line (read as a stream)
+      - application/json: a list of user response dicts, or {"responses": [...], "k": 3}
+    The optional 'k' query parameter sets the number of courses per user.
+    Results stream back as NDJSON, one line per user in input order. An entry that
+    is not valid JSON or not an object gets an error line with its "index" (and,
+    for NDJSON, its input "line" number); the other entries are still scored.
+    """
+    k = request.args.get('k')
+
+    if 'ndjson' in (request.content_type or ''):
+        entries = _read_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            if k is None:
+                k = data.get('k')
+            data = data.get('responses')
+        if not isinstance(data, list):
+            return jsonify({'error': 'Invalid payload. Expected a list of user responses or NDJSON lines.'}), 400
+        entries = ((None, *_check_entry(entry)) for entry in data)
+
+    if k is None:
+        k = 3
+    else:
+        try:
+            k = _parse_k(k)
+        except (TypeError, ValueError):
+            return jsonify({'error': "Invalid 'k'. Expected a positive integer."}), 400
+
+    def generate():
+        try:
+            for result in _score_entries(entries, k):
+                yield json.dumps(result) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+from modules.data_preprocessing import ColumnProfile, apply_dtypes, infer_dtypes
+
+def test_float32_checked_on_integer_chunks_before_a_float_chunk():
+    chunks = [pd.DataFrame({"x": ["123456789", "16777217"]}), pd.DataFrame({"x": ["0.5"]})]
+    dtypes = infer_dtypes(chunks)
+    assert dtypes["x"] == np.dtype(np.float64)
+    values = apply_dtypes(pd.concat(chunks, ignore_index=True), dtypes)["x"]
+    assert values.tolist() == [123456789.0, 16777217.0, 0.5]
+
+def test_small_integers_then_float_chunk_stay_float32():
+    profile = ColumnProfile()
+    profile.update(pd.Series(["1", "2"]))
+    profile.update(pd.Series(["0.5"]))
+    assert profile.dtype() == np.dtype(np.float32)
+
+def test_integer_chunks_only_stay_integer():
+    chunks = [pd.DataFrame({"x": ["16777217"]}), pd.DataFrame({"x": ["3"]})]
+    assert infer_dtypes(chunks)["x"] == np.dtype(np.int32)
@@ -0,0 +1,122 @@
+"""
+Local stand-in for the Together image API, for exercising the image pipeline
+without spending API quota.
+
+Usage:
+    python together_stub_server.py --port 8765 --latency 1.0 --rate-limit-every 7
+    TOGETHER_BASE_URL=http://127.0.0.1:8765/v1 TOGETHER_API_KEY=stub \
+        python create_animation.py "A carpenter planing a board" --frames 20
+"""
+import json
+import time
+import base64
+import struct
+import zlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def make_png(width, height, seed):
+    """Build a small solid-colour PNG without third-party libraries"""
+    color = bytes([(seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256])
+    raw = b"".join(b"\x00" + color * width for _ in range(height))
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+class StubState:
+    def __init__(self, latency, rate_limit_every, response_format, size):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.response_format = response_format
+        self.size = size
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.images = {}
+        self.lock = threading.Lock()
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/images/generations"):
+                return self._send(404, b'{"error": {"message": "not found"}}')
+
+            with state.lock:
+                state.requests += 1
+                number = state.requests
+                state.in_flight += 1
+                state.max_in_flight = max(state.max_in_flight, state.in_flight)
+            try:
+                if state.rate_limit_every and number % state.rate_limit_every == 0:
+                    return self._send(429, b'{"error": {"message": "rate limit exceeded"}}')
+
+                time.sleep(state.latency)
+                png = make_png(state.size, state.size, abs(hash(payload.get("prompt", ""))) % 1000)
+                if state.response_format == "url":
+                    with state.lock:
+                        state.images[number] = png
+                    host, port = self.server.server_address[:2]
+                    item = {"index": 0, "url": f"http://{host}:{port}/images/{number}.png"}
+                else:
+                    item = {"index": 0, "b64_json": base64.b64encode(png).decode()}
+                body = {"id": f"stub-{number}", "model": payload.get("model"), "object": "list", "data": [item]}
+                self._send(200, json.dumps(body).encode())
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def do_GET(self):
+            if self.path.startswith("/images/"):
+                number = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+                png = state.images.get(number)
+                if png is None:
+                    return self._send(404, b"")
+                return self._send(200, png, "image/png")
+            if self.path == "/stats":
+                with state.lock:
+                    stats = {"requests": state.requests, "max_in_flight": state.max_in_flight}
+                return self._send(200, json.dumps(stats).encode())
+            self._send(404, b"")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(port=8765, latency=1.0, rate_limit_every=0, response_format="b64_json", size=64):
+    """Start the stub server in a background thread and return it"""
+    state = StubState(latency, rate_limit_every, response_format, size)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stub of the Together image API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="Seconds per image request")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with HTTP 429")
+    parser.add_argument("--format", choices=["b64_json", "url"], default="b64_json")
+    parser.add_argument("--size", type=int, default=64, help="Width and height of returned images")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.rate_limit_every, args.format, args.size)
+    print(f"Stub Together API listening on http://127.0.0.1:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()